@@ -2,11 +2,18 @@ from datetime import datetime
 from uuid import UUID
 
 import uuid_utils
-from pgvector.sqlalchemy import VECTOR
+from pgvector.sqlalchemy import BIT, HALFVEC
+from sqlalchemy import Column, Computed, Index, text
 from sqlalchemy.dialects.postgresql import ARRAY as PG_ARRAY
 from sqlmodel import Field, SQLModel, String
 
-from app.helpers.enums import ServiceStatus, ServiceType, UserRole
+from app.helpers.enums import (
+    EmbeddingModelStatus,
+    JobPriority,
+    ServiceStatus,
+    ServiceType,
+    UserRole,
+)
 
 
 def uuid7() -> UUID:
@@ -26,26 +33,119 @@ class User(SQLModel, table=True):
 
 
 class Image(SQLModel, table=True):
+    __table_args__ = (
+        Index(
+            "ix_image_embeddings_bin",
+            "embeddings_bin",
+            postgresql_using="hnsw",
+            postgresql_ops={"embeddings_bin": "bit_hamming_ops"},
+        ),
+    )
+
     id: UUID = Field(default_factory=uuid7, primary_key=True)
     name: str
-    path: str
-    thumb: str | None = Field(default=None)
+    # indexed for the orphan collector, which looks files up by path
+    path: str = Field(index=True)
+    thumb: str | None = Field(default=None, index=True)
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
     tags: list[str] = Field(default=[], sa_type=PG_ARRAY(String))
-    embeddings: list[float] | None = Field(sa_type=VECTOR(512), default=None)
+    # the subset of `tags` written by auto-tagging, replaced on every re-tag
+    auto_tags: list[str] = Field(default=[], sa_type=PG_ARRAY(String))
+    embeddings: list[float] | None = Field(sa_type=HALFVEC(512), default=None)
+    # maintained by postgres from `embeddings`, never written by the app
+    embeddings_bin: str | None = Field(
+        default=None,
+        sa_column=Column(
+            BIT(512),
+            Computed("binary_quantize(embeddings)::bit(512)", persisted=True),
+        ),
+    )
+    embedding_model: str | None = Field(default=None)
     hash: str | None = Field(default=None, unique=True)
     uploaded_by: UUID | None = Field(
         default=None, foreign_key="user.id", ondelete="SET NULL"
     )
+    # set once the NEIGHBORS stage has materialized this image's neighbour list
+    neighbors_updated_at: datetime | None = Field(default=None)
+
+
+class EmbeddingModel(SQLModel, table=True):
+    name: str = Field(primary_key=True)
+    status: EmbeddingModelStatus = Field(default=EmbeddingModelStatus.BUILDING)
+    created_at: datetime = Field(default_factory=datetime.now)
+    updated_at: datetime = Field(default_factory=datetime.now)
+
+
+class ImageEmbedding(SQLModel, table=True):
+    """Embeddings from a BUILDING model, staged until it is promoted."""
+
+    image_id: UUID = Field(foreign_key="image.id", ondelete="CASCADE", primary_key=True)
+    model: str = Field(
+        foreign_key="embeddingmodel.name", ondelete="CASCADE", primary_key=True
+    )
+    # None when the image could not be read
+    embeddings: list[float] | None = Field(sa_type=HALFVEC(512), default=None)
+
+
+class ImageNeighbor(SQLModel, table=True):
+    image_id: UUID = Field(foreign_key="image.id", ondelete="CASCADE", primary_key=True)
+    neighbor_id: UUID = Field(
+        foreign_key="image.id", ondelete="CASCADE", primary_key=True, index=True
+    )
+    similarity: float
+
+
+# jobs that are queued or being worked on, at most one per image and service type
+ACTIVE_JOBS = "status IN ('PENDING', 'RUNNING')"
 
 
 class ServiceQ(SQLModel, table=True):
+    __table_args__ = (
+        Index(
+            "ux_serviceq_active",
+            "image_id",
+            "service_type",
+            unique=True,
+            postgresql_where=text(ACTIVE_JOBS),
+        ),
+        # only pending rows are ever dequeued, finished ones stay out of the index.
+        # the column order lets the dequeue skip-scan the uploaders of a priority
+        Index(
+            "ix_serviceq_pending",
+            "priority",
+            "uploaded_by",
+            "run_after",
+            postgresql_where=text("status = 'PENDING'"),
+        ),
+        Index(
+            "ix_serviceq_lease",
+            "locked_until",
+            postgresql_where=text("status = 'RUNNING'"),
+        ),
+    )
+
     id: UUID = Field(default_factory=uuid7, primary_key=True)
-    image_id: UUID = Field(foreign_key="image.id", ondelete="CASCADE")
+    image_id: UUID = Field(foreign_key="image.id", ondelete="CASCADE", index=True)
     service_type: ServiceType
     status: ServiceStatus = Field(default=ServiceStatus.PENDING)
     attempts: int = Field(default=0)
     max_attempts: int = Field(default=3)
+    # lease of a RUNNING job, renewed by heartbeats while the job is alive
+    locked_until: datetime | None = Field(default=None)
+    # a PENDING job is not picked up before this, pushed back after each failure
+    run_after: datetime = Field(default_factory=datetime.now)
+    last_error: str | None = Field(default=None)
+    priority: int = Field(default=JobPriority.INTERACTIVE)
+    # copied from the image, the dequeue shares workers fairly between uploaders
+    uploaded_by: UUID | None = Field(default=None)
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
+
+
+class FileDeletion(SQLModel, table=True):
+    """A file left behind by a deleted image, removed by the reaper."""
+
+    id: UUID = Field(default_factory=uuid7, primary_key=True)
+    path: str
+    created_at: datetime = Field(default_factory=datetime.now)
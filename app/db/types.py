@@ -4,7 +4,13 @@ from uuid import UUID
 
 from pydantic import BaseModel
 
-from app.helpers.enums import UserRole
+from app.helpers.enums import (
+    BulkOperation,
+    EmbeddingModelStatus,
+    ProfileStatus,
+    ProfileTarget,
+    UserRole,
+)
 
 
 class ImageExistsResult(TypedDict):
@@ -46,11 +52,33 @@ class SimilarityListResponse(BaseModel):
     items: list[ImageWithSimilarity]
 
 
+class CombinedSearchRequest(BaseModel):
+    positive: list[str] = []
+    negative: list[str] = []
+    positive_images: list[UUID] = []
+    negative_images: list[UUID] = []
+
+
 class ImageUpdateRequest(BaseModel):
     name: str | None = None
     tags: list[str] | None = None
 
 
+class BulkRequest(BaseModel):
+    ids: list[UUID]
+    operation: BulkOperation
+    # for the tag operations
+    tags: list[str] = []
+    # for RENAME, a POSIX regex and its replacement, applied to every match
+    pattern: str | None = None
+    replacement: str = ""
+
+
+class BulkResponse(BaseModel):
+    operation: BulkOperation
+    affected: int
+
+
 class DeleteResponse(BaseModel):
     message: str
 
@@ -66,3 +94,40 @@ class UserResponse(BaseModel):
     avatar_url: str | None
     provider: str
     role: UserRole
+
+
+class EmbeddingModelRequest(BaseModel):
+    name: str
+
+
+class EmbeddingModelResponse(BaseModel):
+    name: str
+    status: EmbeddingModelStatus
+    staged: int
+    embedded: int
+    created_at: datetime
+    updated_at: datetime
+
+
+class EnqueueResponse(BaseModel):
+    # jobs added, work that was already queued is not counted
+    thumb: int
+    vector: int
+
+
+class ProfileRequest(BaseModel):
+    kind: ProfileTarget
+    # route template such as /images/search, or a ServiceType
+    target: str
+    count: int = 1
+
+
+class ProfileResponse(BaseModel):
+    id: UUID
+    kind: ProfileTarget
+    target: str
+    status: ProfileStatus
+    requested: int
+    captured: int
+    samples: int
+    created_at: datetime
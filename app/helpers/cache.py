@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable
+from uuid import UUID
+
+from app.helpers.constants import SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL
+
+# bumped whenever the set of searchable embeddings changes, so every ranked list
+# cached before the bump is treated as stale
+_generation = 0
+_generation_lock = threading.Lock()
+
+
+def library_generation() -> int:
+    return _generation
+
+
+def bump_generation() -> None:
+    global _generation
+    with _generation_lock:
+        _generation += 1
+
+
+RankedIds = list[tuple[UUID, float]]
+
+
+class SearchCache:
+    """LRU of ranked (id, similarity) lists, tagged with the library generation."""
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self._max_size = max_size
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, tuple[int, float, RankedIds]] = (
+            OrderedDict()
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> RankedIds | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                generation, stored_at, ranked = entry
+                if (
+                    generation == _generation
+                    and time.monotonic() - stored_at < self._ttl
+                ):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return ranked
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, generation: int, ranked: RankedIds) -> None:
+        """Store `ranked` as computed at `generation`; stale results are dropped."""
+
+        with self._lock:
+            if generation != _generation:
+                return
+            self._entries[key] = (generation, time.monotonic(), ranked)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+search_cache = SearchCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
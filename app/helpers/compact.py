@@ -0,0 +1,48 @@
+from collections.abc import Mapping, Sequence
+
+import msgpack
+from fastapi import Response
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+_MSGPACK_TYPES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack")
+
+# the server-side path and thumb are left out, clients fetch /images/{id}/thumb
+_COLUMNS = ("id", "name", "created_at", "updated_at", "tags", "uploaded_by")
+
+
+def wants_msgpack(accept: str | None) -> bool:
+    return accept is not None and any(t in accept for t in _MSGPACK_TYPES)
+
+
+def msgpack_page(
+    page: int,
+    page_size: int,
+    count: int,
+    rows: Sequence[Mapping],
+    similarity: bool = False,
+) -> Response:
+    """
+    A page of images as MessagePack, built straight from the row mappings.
+    Columnar: `columns` maps each field to a list with one value per image.
+    Ids are 16-byte binaries, timestamps ISO 8601 strings like in JSON.
+    """
+
+    columns: dict[str, list] = {
+        "id": [row["id"].bytes for row in rows],
+        "name": [row["name"] for row in rows],
+        "created_at": [row["created_at"].isoformat() for row in rows],
+        "updated_at": [row["updated_at"].isoformat() for row in rows],
+        "tags": [row["tags"] for row in rows],
+        "uploaded_by": [
+            row["uploaded_by"].bytes if row["uploaded_by"] else None for row in rows
+        ],
+    }
+    if similarity:
+        columns["similarity"] = [round(float(row["similarity"]), 4) for row in rows]
+
+    body = {"page": page, "page_size": page_size, "count": count, "columns": columns}
+    return Response(
+        msgpack.packb(body, use_bin_type=True),
+        media_type=MSGPACK_MEDIA_TYPE,
+        headers={"Vary": "Accept"},
+    )
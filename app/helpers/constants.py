@@ -12,14 +12,108 @@ ALLOWED_IMAGE_EXTENSIONS = {
 
 POLL_INTERVAL = 2
 MAX_CONCURRENT_JOBS = 10
+# a RUNNING job whose lease lapses is assumed lost and goes back to PENDING;
+# running jobs renew their lease every JOB_HEARTBEAT_INTERVAL seconds
+JOB_LEASE_SECONDS = 300
+JOB_HEARTBEAT_INTERVAL = 60
+REAP_INTERVAL = 60
+# failed jobs wait RETRY_BASE_DELAY * 2^(attempts - 1) seconds, capped and jittered
+RETRY_BASE_DELAY = 10
+RETRY_MAX_DELAY = 3600
 THUMB_SIZE = (448, 448)
+# skip thumbnailing in the pipeline, thumbs are made on first request instead and
+# VECTOR/DETECTOR read a reduced decode of the original. for very large imports
+LAZY_THUMBNAILS = os.getenv("LAZY_THUMBNAILS", "false").lower() == "true"
 
+# initial embedding model, later ones are rolled out through /admin/embedding-models
 CLIP_MODEL = "openai/clip-vit-base-patch32"
+EMBEDDING_DIM = 512
+
+# COCO detector run on thumbnails by the DETECTOR stage. concurrent jobs are
+# collected for up to DETECTOR_BATCH_WAIT seconds into one forward pass
+DETECTOR_BATCH_SIZE = 8
+DETECTOR_BATCH_WAIT = 0.05
+DETECTOR_SCORE_THRESHOLD = 0.5
+DETECTOR_MAX_TAGS = 5
+
+# zero-shot tags scored from the CLIP image embeddings against a vocabulary,
+# comma separated. after changing it run scripts/retag_library.py
+AUTOTAG_VOCABULARY = [
+    tag.strip()
+    for tag in os.getenv(
+        "AUTOTAG_VOCABULARY",
+        "animal,architecture,beach,car,cat,city,concert,dog,document,flower,food,"
+        "forest,landscape,mountain,night,people,portrait,screenshot,snow,sport,"
+        "street,sunset,text,water",
+    ).split(",")
+    if tag.strip()
+]
+AUTOTAG_PROMPT = "a photo of {}"
+# tags are picked by their softmax probability over the vocabulary, with CLIP's
+# logit scale as the inverse temperature
+AUTOTAG_LOGIT_SCALE = 100.0
+AUTOTAG_MIN_PROBABILITY = 0.15
+AUTOTAG_MAX_TAGS = 3
+AUTOTAG_BATCH_SIZE = 5000
+
+REEMBED_BATCH_SIZE = 32
+# seconds between batches, keeps re-embedding in the background
+REEMBED_BATCH_INTERVAL = 1
+REEMBED_POLL_INTERVAL = 30
+
+# finished serviceq rows are deleted once this old; failed ones are kept longer
+# since they are the only record of what went wrong. the latest row of each stage
+# of an image is never deleted
+SERVICEQ_RETENTION_DAYS = 7
+SERVICEQ_FAILED_RETENTION_DAYS = 30
+SWEEP_INTERVAL = 300
+SWEEP_BATCH_SIZE = 1000
+
+# files of deleted images are removed in the background, right after the delete
+# commits or at the latest every REAPER_INTERVAL seconds
+REAPER_INTERVAL = 30
+REAPER_BATCH_SIZE = 500
+# files in UPLOAD_DIR and its thumbs/ that no image refers to are collected this
+# often. younger files are left alone, uploads and thumbs are written before the
+# row that refers to them commits
+ORPHAN_GC_INTERVAL = 3600
+ORPHAN_GRACE_SECONDS = 3600
+ORPHAN_GC_BATCH_SIZE = 1000
+
+# ids accepted by one /images/bulk request
+MAX_BULK_IDS = 10000
+
+# rows fetched per round trip from the server-side cursor of /admin/export
+EXPORT_CHUNK_SIZE = 2000
+
+# page_size ceiling of /images/list for MessagePack clients, JSON stays at 100
+COMPACT_MAX_PAGE_SIZE = 1000
 
 CPU_ONLY = True
 SIMILARITY_THRESHOLD = 0.5
 TEXT_SIMILARITY_THRESHOLD = 0.9
 
+# binary-quantized candidates fetched via the hamming index before exact re-ranking
+RERANK_CANDIDATES = 500
+# length of the precomputed neighbour list served by /images/{id}/similar
+NEIGHBORS_K = 100
+
+# ranked result lists kept per query, invalidated when embeddings change
+SEARCH_CACHE_SIZE = 256
+SEARCH_CACHE_TTL = 300
+
+# combined search: weight of the negative examples and cap on terms per request
+NEGATIVE_QUERY_WEIGHT = 0.5
+MAX_COMBINED_TERMS = 16
+
+# requests with a Server-Timing breakdown slower than this are logged with it
+SLOW_REQUEST_MS = 500
+
+# admin profiling: seconds between stack samples, finished profiles kept in memory
+PROFILE_SAMPLE_INTERVAL = 0.005
+PROFILE_HISTORY = 20
+MAX_PROFILE_COUNT = 100
+
 WORKER_LOG_PATH = "worker.log"
 
 SESSION_SECRET = os.getenv("SESSION_SECRET", "")
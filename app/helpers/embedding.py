@@ -0,0 +1,25 @@
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.db.model import EmbeddingModel
+from app.helpers.cache import library_generation
+from app.helpers.constants import CLIP_MODEL
+from app.helpers.enums import EmbeddingModelStatus
+
+# (library generation, model name); promoting a model bumps the generation
+_active: tuple[int, str] | None = None
+
+
+async def active_model(session: AsyncSession) -> str:
+    """Name of the model that produced the embeddings search currently runs on."""
+
+    global _active
+    generation = library_generation()
+    if _active is None or _active[0] != generation:
+        result = await session.exec(
+            select(EmbeddingModel.name).where(
+                EmbeddingModel.status == EmbeddingModelStatus.ACTIVE
+            )
+        )
+        _active = (generation, result.first() or CLIP_MODEL)
+    return _active[1]
@@ -1,4 +1,4 @@
-from enum import Enum
+from enum import Enum, IntEnum
 
 
 class UserRole(str, Enum):
@@ -18,3 +18,37 @@ class ServiceType(str, Enum):
     THUMB = "THUMB"
     VECTOR = "VECTOR"
     DETECTOR = "DETECTOR"
+    NEIGHBORS = "NEIGHBORS"
+    AUTOTAG = "AUTOTAG"
+
+
+class JobPriority(IntEnum):
+    """Lower runs first."""
+
+    INTERACTIVE = 0
+    BULK = 10
+
+
+class EmbeddingModelStatus(str, Enum):
+    BUILDING = "BUILDING"
+    ACTIVE = "ACTIVE"
+    RETIRED = "RETIRED"
+
+
+class ProfileTarget(str, Enum):
+    ROUTE = "ROUTE"
+    JOB = "JOB"
+
+
+class ProfileStatus(str, Enum):
+    ARMED = "ARMED"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+
+
+class BulkOperation(str, Enum):
+    DELETE = "DELETE"
+    ADD_TAGS = "ADD_TAGS"
+    REMOVE_TAGS = "REMOVE_TAGS"
+    SET_TAGS = "SET_TAGS"
+    RENAME = "RENAME"
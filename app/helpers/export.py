@@ -0,0 +1,141 @@
+import io
+import json
+import tarfile
+import tempfile
+import time
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+from datetime import datetime
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import ColumnElement, text
+from sqlmodel import col, func, select
+
+from app.db import async_session
+from app.db.model import Image
+from app.helpers.constants import EMBEDDING_DIM, EXPORT_CHUNK_SIZE
+
+_BLOCK = tarfile.BLOCKSIZE
+_EXPORT_COLS = (
+    Image.id,
+    Image.name,
+    Image.created_at,
+    Image.updated_at,
+    Image.tags,
+    Image.uploaded_by,
+    Image.embedding_model,
+)
+
+
+@dataclass
+class ExportFilter:
+    tag: str | None = None
+    uploaded_by: UUID | None = None
+    created_after: datetime | None = None
+    created_before: datetime | None = None
+    embedded_only: bool = False
+
+    def clauses(self) -> list[ColumnElement[bool]]:
+        clauses = []
+        if self.tag:
+            clauses.append(Image.tags.contains([self.tag]))  # type: ignore[attr-defined]
+        if self.uploaded_by is not None:
+            clauses.append(col(Image.uploaded_by) == self.uploaded_by)
+        if self.created_after is not None:
+            clauses.append(col(Image.created_at) >= self.created_after)
+        if self.created_before is not None:
+            clauses.append(col(Image.created_at) < self.created_before)
+        if self.embedded_only:
+            clauses.append(col(Image.embeddings).is_not(None))
+        return clauses
+
+
+def _tar_header(name: str, size: int) -> bytes:
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = int(time.time())
+    info.mode = 0o644
+    return info.tobuf(format=tarfile.PAX_FORMAT)
+
+
+def _padding(size: int) -> bytes:
+    return b"\0" * (-size % _BLOCK)
+
+
+def _npy_header(rows: int) -> bytes:
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(
+        header,
+        {"descr": "<f4", "fortran_order": False, "shape": (rows, EMBEDDING_DIM)},
+    )
+    return header.getvalue()
+
+
+def _metadata_line(row) -> bytes:
+    return (
+        json.dumps(
+            {
+                "id": str(row["id"]),
+                "name": row["name"],
+                "created_at": row["created_at"].isoformat(),
+                "updated_at": row["updated_at"].isoformat(),
+                "tags": row["tags"],
+                "uploaded_by": str(row["uploaded_by"]) if row["uploaded_by"] else None,
+                "embedding_model": row["embedding_model"],
+            }
+        ).encode()
+        + b"\n"
+    )
+
+
+async def export_library(filters: ExportFilter) -> AsyncIterator[bytes]:
+    """
+    Stream the matching images as a tar of `embeddings.npy`, a float32
+    (n, EMBEDDING_DIM) matrix, and `images.jsonl` with the metadata of row i on
+    line i. Images without embeddings get a row of NaN. Rows are read through a
+    server-side cursor in one snapshot, and the metadata is spooled to a
+    temporary file while the matrix streams, so memory stays flat however
+    large the library is.
+    """
+
+    clauses = filters.clauses()
+    async with async_session() as session:
+        # the count sizes the .npy header, the snapshot keeps the rows in step
+        await session.exec(
+            text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+        )
+        count_result = await session.exec(
+            select(func.count()).select_from(Image).where(*clauses)
+        )
+        rows = count_result.one()
+
+        header = _npy_header(rows)
+        matrix_size = len(header) + rows * EMBEDDING_DIM * 4
+        yield _tar_header("embeddings.npy", matrix_size)
+        yield header
+
+        with tempfile.TemporaryFile() as metadata:
+            result = await session.stream(
+                select(*_EXPORT_COLS, Image.embeddings)  # type: ignore[call-overload]
+                .where(*clauses)
+                .order_by(Image.id)
+                .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+            )
+            async for chunk in result.mappings().partitions(EXPORT_CHUNK_SIZE):
+                block = np.full((len(chunk), EMBEDDING_DIM), np.nan, dtype="<f4")
+                for i, row in enumerate(chunk):
+                    if row["embeddings"] is not None:
+                        block[i] = row["embeddings"].to_numpy()
+                    metadata.write(_metadata_line(row))
+                yield block.tobytes()
+            yield _padding(matrix_size)
+
+            metadata_size = metadata.tell()
+            metadata.seek(0)
+            yield _tar_header("images.jsonl", metadata_size)
+            while data := metadata.read(1 << 20):
+                yield data
+            yield _padding(metadata_size)
+
+    yield b"\0" * (2 * _BLOCK)
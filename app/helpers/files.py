@@ -0,0 +1,26 @@
+import asyncio
+import os
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.db.model import FileDeletion
+from app.helpers.constants import UPLOAD_DIR
+
+# set once deletions have committed, wakes the reaper before its next interval
+deletions_pending = asyncio.Event()
+
+
+def image_files(path: str, thumb: str | None) -> list[str]:
+    """The original and thumbnail of an image, guessing the thumb if none is stored."""
+
+    return [path, thumb or os.path.join(UPLOAD_DIR, "thumbs", os.path.basename(path))]
+
+
+def delete_later(session: AsyncSession, paths: list[str]) -> None:
+    """
+    Queue files for the reaper in the session's transaction, so they are only
+    removed if the rows referring to them are really gone. Set
+    `deletions_pending` after the commit.
+    """
+
+    session.add_all(FileDeletion(path=path) for path in paths)
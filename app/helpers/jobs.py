@@ -0,0 +1,73 @@
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.db.model import ACTIVE_JOBS, ServiceQ
+from app.helpers.constants import LAZY_THUMBNAILS
+from app.helpers.enums import JobPriority, ServiceType
+
+
+async def enqueue(
+    session: AsyncSession,
+    image_id: UUID,
+    service_type: ServiceType,
+    priority: int = JobPriority.INTERACTIVE,
+    uploaded_by: UUID | None = None,
+) -> bool:
+    """
+    Queue a job unless the same work is already pending or running for the
+    image. Returns whether a row was added.
+    """
+
+    result = await session.exec(
+        insert(ServiceQ)
+        .values(
+            image_id=image_id,
+            service_type=service_type,
+            priority=priority,
+            uploaded_by=uploaded_by,
+        )
+        .on_conflict_do_nothing(
+            index_elements=["image_id", "service_type"],
+            index_where=text(ACTIVE_JOBS),
+        )
+    )
+    return result.rowcount > 0
+
+
+async def enqueue_missing(session: AsyncSession) -> dict[ServiceType, int]:
+    """
+    Queue THUMB for every image without a thumbnail and VECTOR for every image
+    that has one but no embeddings, skipping work that is already queued.
+    With lazy thumbnails, VECTOR is queued for every image without embeddings.
+    Returns how many jobs of each type were added.
+    """
+
+    result = await session.exec(
+        text(f"""
+            WITH added AS (
+                INSERT INTO serviceq (
+                    id, image_id, service_type, status, priority, uploaded_by,
+                    run_after, created_at, updated_at
+                )
+                SELECT gen_random_uuid(), id,
+                    CASE WHEN thumb IS NULL AND NOT :lazy
+                        THEN 'THUMB'::servicetype
+                        ELSE 'VECTOR'::servicetype
+                    END,
+                    'PENDING', :priority, uploaded_by, NOW(), NOW(), NOW()
+                FROM image
+                WHERE (thumb IS NULL AND NOT :lazy) OR embeddings IS NULL
+                ON CONFLICT (image_id, service_type) WHERE {ACTIVE_JOBS} DO NOTHING
+                RETURNING service_type
+            )
+            SELECT
+                count(*) FILTER (WHERE service_type = 'THUMB'),
+                count(*) FILTER (WHERE service_type = 'VECTOR')
+            FROM added
+        """).bindparams(priority=JobPriority.BULK, lazy=LAZY_THUMBNAILS)
+    )
+    thumb, vector = result.one()
+    return {ServiceType.THUMB: thumb, ServiceType.VECTOR: vector}
@@ -0,0 +1,54 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+# kept free of app imports so the db and worker modules can record into it
+
+REQUEST_LATENCY = Histogram(
+    "scene_http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
+
+QUEUE_DEPTH = Gauge(
+    "scene_serviceq_jobs",
+    "Jobs in serviceq by service type and status, sampled on scrape",
+    ["service_type", "status"],
+)
+
+JOB_DURATION = Histogram(
+    "scene_job_duration_seconds",
+    "Wall time of a worker job, including waiting on the database",
+    ["service_type", "outcome"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+
+JOB_ATTEMPTS = Histogram(
+    "scene_job_attempts",
+    "Attempt number a job was on when it finished",
+    ["service_type", "outcome"],
+    buckets=(1, 2, 3, 5, 10),
+)
+
+INFERENCE_DURATION = Histogram(
+    "scene_model_inference_seconds",
+    "Model forward pass time",
+    ["kind", "model"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+INFERENCE_ITEMS = Counter(
+    "scene_model_inference_items",
+    "Texts or images passed through the model",
+    ["kind", "model"],
+)
+
+DB_POOL_WAIT = Histogram(
+    "scene_db_pool_wait_seconds",
+    "Time spent waiting to check a connection out of the pool",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5, 30),
+)
+
+FILES_REMOVED = Counter(
+    "scene_files_removed",
+    "Upload and thumb files removed from disk, by why they were removed",
+    ["reason"],
+)
@@ -0,0 +1,162 @@
+import os
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Iterator
+from uuid import UUID, uuid4
+
+from app.helpers.constants import PROFILE_HISTORY, PROFILE_SAMPLE_INTERVAL
+from app.helpers.enums import ProfileStatus, ProfileTarget
+
+# stdlib modules a thread sits in while it has nothing to do; such samples are
+# dropped. full paths, so app modules with the same names still count
+_STDLIB = sysconfig.get_paths()["stdlib"]
+_IDLE_FILES = frozenset(
+    os.path.join(_STDLIB, name)
+    for name in (
+        "selectors.py",
+        "threading.py",
+        "queue.py",
+        os.path.join("concurrent", "futures", "thread.py"),
+    )
+)
+
+
+@dataclass
+class Profile:
+    kind: ProfileTarget
+    target: str
+    requested: int
+    id: UUID = field(default_factory=uuid4)
+    created_at: datetime = field(default_factory=datetime.now)
+    claimed: int = 0
+    captured: int = 0
+    in_flight: int = 0
+    samples: Counter[str] = field(default_factory=Counter)
+
+    @property
+    def status(self) -> ProfileStatus:
+        if self.captured >= self.requested:
+            return ProfileStatus.DONE
+        if self.in_flight:
+            return ProfileStatus.RUNNING
+        return ProfileStatus.ARMED
+
+    def folded(self) -> str:
+        """Samples in collapsed-stack format, as read by flamegraph.pl and speedscope."""
+
+        return "".join(f"{stack} {n}\n" for stack, n in self.samples.most_common())
+
+
+def _folded_stack(frame) -> str | None:
+    if frame.f_code.co_filename in _IDLE_FILES:
+        return None
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(
+            f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+        )
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Profiler:
+    """
+    Statistical profiler for the next N requests to a route or jobs of a service
+    type. While a profiled block is in flight, a sampler thread snapshots every
+    thread's stack, so work pushed to asyncio.to_thread is covered as well.
+    Concurrent requests and jobs share the process, so their stacks can show up
+    in each other's profiles. When nothing is armed, the cost is a truthiness check.
+    """
+
+    def __init__(self, interval: float, history: int) -> None:
+        self._interval = interval
+        self._history = history
+        self._lock = threading.Lock()
+        self._armed: dict[tuple[ProfileTarget, str], Profile] = {}
+        self._profiles: OrderedDict[UUID, Profile] = OrderedDict()
+        self._sampler: threading.Thread | None = None
+
+    def arm(self, kind: ProfileTarget, target: str, count: int) -> Profile:
+        profile = Profile(kind=kind, target=target, requested=count)
+        with self._lock:
+            previous = self._armed.pop((kind, target), None)
+            if previous is not None and previous.status == ProfileStatus.ARMED:
+                self._profiles.pop(previous.id, None)
+            self._armed[(kind, target)] = profile
+            self._profiles[profile.id] = profile
+            while len(self._profiles) > self._history:
+                self._profiles.popitem(last=False)
+        return profile
+
+    def armed(self, kind: ProfileTarget) -> bool:
+        return any(k == kind for k, _ in list(self._armed))
+
+    def get(self, profile_id: UUID) -> Profile | None:
+        return self._profiles.get(profile_id)
+
+    def recent(self) -> list[Profile]:
+        return list(reversed(self._profiles.values()))
+
+    @contextmanager
+    def capture(self, kind: ProfileTarget, target: str) -> Iterator[None]:
+        """Profile the wrapped block if `target` has an armed profile with slots left."""
+
+        if not self._armed:
+            yield
+            return
+
+        with self._lock:
+            profile = self._armed.get((kind, target))
+            if profile is None or profile.claimed >= profile.requested:
+                profile = None
+            else:
+                profile.claimed += 1
+                profile.in_flight += 1
+                if profile.claimed >= profile.requested:
+                    del self._armed[(kind, target)]
+                self._ensure_sampler()
+
+        if profile is None:
+            yield
+            return
+        try:
+            yield
+        finally:
+            with self._lock:
+                profile.in_flight -= 1
+                profile.captured += 1
+
+    def _ensure_sampler(self) -> None:
+        if self._sampler is None or not self._sampler.is_alive():
+            self._sampler = threading.Thread(
+                target=self._sample, name="profiler", daemon=True
+            )
+            self._sampler.start()
+
+    def _sample(self) -> None:
+        me = threading.get_ident()
+        while True:
+            time.sleep(self._interval)
+            with self._lock:
+                active = [p for p in self._profiles.values() if p.in_flight]
+                if not active:
+                    self._sampler = None
+                    return
+            stacks = [
+                stack
+                for ident, frame in sys._current_frames().items()
+                if ident != me and (stack := _folded_stack(frame)) is not None
+            ]
+            with self._lock:
+                for profile in active:
+                    profile.samples.update(stacks)
+
+
+profiler = Profiler(PROFILE_SAMPLE_INTERVAL, PROFILE_HISTORY)
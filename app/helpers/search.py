@@ -0,0 +1,166 @@
+from typing import Awaitable, Callable, Collection, Hashable, Sequence
+from uuid import UUID
+
+import numpy as np
+from pgvector.sqlalchemy import HALFVEC
+from sqlalchemy import ColumnElement, RowMapping, cast, literal, text
+from sqlmodel import func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.db.model import Image, ImageNeighbor
+from app.helpers.cache import RankedIds, library_generation, search_cache
+from app.helpers.constants import (
+    EMBEDDING_DIM,
+    NEGATIVE_QUERY_WEIGHT,
+    RERANK_CANDIDATES,
+)
+from app.helpers.timing import mark, timed
+
+IMAGE_COLS = (
+    Image.id,
+    Image.name,
+    Image.path,
+    Image.thumb,
+    Image.created_at,
+    Image.updated_at,
+    Image.tags,
+    Image.uploaded_by,
+)
+
+
+def _reranked(
+    query_vector: Sequence[float], threshold: float, exclude_ids: Collection[UUID]
+) -> tuple[tuple[ColumnElement[bool], ...], ColumnElement[float]]:
+    """
+    Two-pass nearest neighbour filter. The hamming index over the binary-quantized
+    embeddings yields the top RERANK_CANDIDATES, which are then re-ranked by exact
+    cosine distance on the halfvec embeddings. Returns the where clauses and the
+    distance expression to order by.
+    """
+
+    query = cast(literal(query_vector, HALFVEC(EMBEDDING_DIM)), HALFVEC(EMBEDDING_DIM))
+    candidates = (
+        select(Image.id)
+        .order_by(Image.embeddings_bin.hamming_distance(func.binary_quantize(query)))  # type: ignore[union-attr]
+        .limit(RERANK_CANDIDATES)
+        .cte("candidates")
+    )
+
+    distance = Image.embeddings.cosine_distance(query)  # type: ignore[attr-defined]
+    filters: tuple[ColumnElement[bool], ...] = (
+        Image.id.in_(select(candidates.c.id)),  # type: ignore[attr-defined]
+        distance < threshold,
+    )
+    if exclude_ids:
+        filters += (Image.id.not_in(exclude_ids),)  # type: ignore[attr-defined]
+    return filters, distance
+
+
+async def _set_ef_search(session: AsyncSession) -> None:
+    # the hnsw scan returns at most ef_search rows, so it must cover the candidate pool
+    await session.exec(text(f"SET LOCAL hnsw.ef_search = {int(RERANK_CANDIDATES)}"))
+
+
+async def nearest_neighbors(
+    session: AsyncSession,
+    query_vector: Sequence[float],
+    threshold: float,
+    exclude_ids: Collection[UUID] = (),
+) -> RankedIds:
+    """Every candidate within `threshold` as (id, similarity), best first."""
+
+    await _set_ef_search(session)
+    filters, distance = _reranked(query_vector, threshold, exclude_ids)
+
+    with timed("rank"):
+        results = await session.exec(
+            select(Image.id, 1 - distance)  # type: ignore[call-overload]
+            .where(*filters)
+            .order_by(distance, Image.id.desc())  # type: ignore[attr-defined]
+        )
+    return [(row[0], float(row[1])) for row in results.all()]
+
+
+def combine_vectors(
+    positive: Sequence[Sequence[float]], negative: Sequence[Sequence[float]]
+) -> list[float]:
+    """Mean of the positive examples minus the weighted mean of the negatives."""
+
+    combined = np.mean(np.asarray(positive, dtype=np.float32), axis=0)
+    if negative:
+        combined -= NEGATIVE_QUERY_WEIGHT * np.mean(
+            np.asarray(negative, dtype=np.float32), axis=0
+        )
+    return (combined / np.linalg.norm(combined)).tolist()
+
+
+def normalize_query(query: str) -> str:
+    # the CLIP tokenizer lowercases and splits on whitespace anyway
+    return " ".join(query.lower().split())
+
+
+async def cached_nearest(
+    session: AsyncSession,
+    key: Hashable,
+    query_vector: Callable[[], Awaitable[Sequence[float]]],
+    threshold: float,
+    exclude_ids: Collection[UUID] = (),
+) -> RankedIds:
+    """
+    Ranked (id, similarity) list for `key`, served from the search cache while the
+    library generation is unchanged. `query_vector` is only awaited on a miss.
+    """
+
+    ranked = search_cache.get((key, threshold))
+    if ranked is None:
+        generation = library_generation()
+        with timed("vector"):
+            vector = await query_vector()
+        ranked = await nearest_neighbors(session, vector, threshold, exclude_ids)
+        search_cache.put((key, threshold), generation, ranked)
+    else:
+        mark("cache", "hit")
+    return ranked
+
+
+async def fetch_ranked_page(session: AsyncSession, ranked: RankedIds) -> list[dict]:
+    """Load the image rows for a slice of a ranked list, keeping its order."""
+
+    if not ranked:
+        return []
+    with timed("fetch"):
+        results = await session.exec(
+            select(*IMAGE_COLS).where(Image.id.in_([id_ for id_, _ in ranked]))  # type: ignore[call-overload, attr-defined]
+        )
+    rows = {row["id"]: row for row in results.mappings().all()}
+    return [
+        {**rows[id_], "similarity": similarity}
+        for id_, similarity in ranked
+        if id_ in rows
+    ]
+
+
+async def materialized_neighbors(
+    session: AsyncSession, image_id: UUID, offset: int, limit: int
+) -> tuple[int, Sequence[RowMapping]]:
+    """Page through the precomputed neighbour list of an image."""
+
+    link = ImageNeighbor.neighbor_id == Image.id
+    with timed("count"):
+        count_result = await session.exec(
+            select(func.count())
+            .select_from(ImageNeighbor)
+            .where(ImageNeighbor.image_id == image_id)
+        )
+    total = count_result.one()
+
+    with timed("fetch", "materialized"):
+        results = await session.exec(
+            select(*IMAGE_COLS, ImageNeighbor.similarity)  # type: ignore[call-overload]
+            .join(ImageNeighbor, link)
+            .where(ImageNeighbor.image_id == image_id)
+            .order_by(ImageNeighbor.similarity.desc(), Image.id.desc())  # type: ignore[attr-defined]
+            .offset(offset)
+            .limit(limit)
+        )
+    return total, results.mappings().all()
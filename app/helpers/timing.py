@@ -0,0 +1,65 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+
+class ServerTiming:
+    """Per-request stage durations, rendered as a Server-Timing header."""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.stages: list[tuple[str, float, str | None]] = []
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def header(self) -> str:
+        parts = []
+        for name, duration, desc in self.stages:
+            part = f"{name};dur={duration:.1f}"
+            if desc:
+                part += f';desc="{desc}"'
+            parts.append(part)
+        parts.append(f"total;dur={self.elapsed_ms():.1f}")
+        return ", ".join(parts)
+
+    def as_dict(self) -> dict[str, float]:
+        summed: dict[str, float] = {}
+        for name, duration, _ in self.stages:
+            summed[name] = round(summed.get(name, 0.0) + duration, 1)
+        return summed
+
+
+_current: ContextVar[ServerTiming | None] = ContextVar("server_timing", default=None)
+
+
+def begin_timing() -> ServerTiming:
+    """Start collecting stages for the current request."""
+
+    timing = ServerTiming()
+    _current.set(timing)
+    return timing
+
+
+@contextmanager
+def timed(name: str, desc: str | None = None) -> Iterator[None]:
+    """Record the wrapped block as a stage; a no-op outside a timed request."""
+
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.stages.append((name, (time.perf_counter() - start) * 1000, desc))
+
+
+def mark(name: str, desc: str) -> None:
+    """Record a zero-length stage, e.g. a cache hit."""
+
+    timing = _current.get()
+    if timing is not None:
+        timing.stages.append((name, 0.0, desc))
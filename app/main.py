@@ -1,26 +1,43 @@
 import asyncio
+import json
 from contextlib import asynccontextmanager
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
+from starlette.routing import Match
 
 import app.helpers.logger as _  # noqa: F401 — registers worker log handler
-from app.helpers.constants import FRONTEND_URL, SESSION_SECRET
-from app.routers import auth, image
+from app.helpers.constants import FRONTEND_URL, SESSION_SECRET, SLOW_REQUEST_MS
+from app.helpers.enums import ProfileTarget
+from app.helpers.logger import logger
+from app.helpers.metrics import REQUEST_LATENCY
+from app.helpers.profiling import profiler
+from app.helpers.timing import begin_timing
+from app.routers import admin, auth, image, metrics
 from app.worker.queue import start_worker
+from app.worker.reaper import start_reaper
+from app.worker.reembed import start_reembed
+from app.worker.sweeper import start_sweeper
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    worker_task = asyncio.create_task(start_worker())
+    tasks = [
+        asyncio.create_task(start_worker()),
+        asyncio.create_task(start_reembed()),
+        asyncio.create_task(start_sweeper()),
+        asyncio.create_task(start_reaper()),
+    ]
     yield
-    worker_task.cancel()
-    try:
-        await worker_task
-    except asyncio.CancelledError:
-        pass
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
 
 
 app = FastAPI(lifespan=lifespan)
@@ -35,6 +52,45 @@ app.add_middleware(
 app.add_middleware(SessionMiddleware, secret_key=SESSION_SECRET)
 
 
+def _route_template(request: Request) -> str | None:
+    # routing only happens inside call_next, so match the templates up front
+    for route in request.app.routes:
+        if route.matches(request.scope)[0] == Match.FULL:
+            return getattr(route, "path", None)
+    return None
+
+
+@app.middleware("http")
+async def record_request_timing(request: Request, call_next):
+    timing = begin_timing()
+    status = 500
+    try:
+        if profiler.armed(ProfileTarget.ROUTE):
+            with profiler.capture(ProfileTarget.ROUTE, _route_template(request) or ""):
+                response = await call_next(request)
+        else:
+            response = await call_next(request)
+        status = response.status_code
+        if timing.stages:
+            response.headers["Server-Timing"] = timing.header()
+        return response
+    finally:
+        # label by route template, not raw path, to keep the series bounded
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        REQUEST_LATENCY.labels(request.method, route, str(status)).observe(
+            timing.elapsed_ms() / 1000
+        )
+        if timing.stages and timing.elapsed_ms() > SLOW_REQUEST_MS:
+            record = {
+                "method": request.method,
+                "route": route,
+                "status": status,
+                "total_ms": round(timing.elapsed_ms(), 1),
+                "stages": timing.as_dict(),
+            }
+            logger.warning(f"Slow request: {json.dumps(record)}")
+
+
 @app.get("/")
 async def read_root():
     return {"message": "Hello, World!"}
@@ -42,6 +98,8 @@ async def read_root():
 
 app.include_router(prefix="/auth", router=auth.router, tags=["auth"])
 app.include_router(prefix="/images", router=image.router, tags=["images"])
+app.include_router(prefix="/admin", router=admin.router, tags=["admin"])
+app.include_router(router=metrics.router)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,301 @@
+from datetime import datetime
+from http import HTTPStatus
+from uuid import UUID
+
+from app.db import SessionDep
+from app.db.model import EmbeddingModel, Image, ImageEmbedding
+from app.db.types import (
+    EmbeddingModelRequest,
+    EmbeddingModelResponse,
+    EnqueueResponse,
+    ErrorResponse,
+    ProfileRequest,
+    ProfileResponse,
+)
+from app.helpers.constants import MAX_PROFILE_COUNT
+from app.helpers.deps import AdminUser
+from app.helpers.enums import EmbeddingModelStatus, ProfileTarget, ServiceType
+from app.helpers.export import ExportFilter, export_library
+from app.helpers.jobs import enqueue_missing
+from app.helpers.logger import logger
+from app.helpers.profiling import Profile, profiler
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.routing import APIRoute
+from sqlalchemy import delete
+from sqlmodel import col, func, select
+
+router = APIRouter()
+
+_ERRORS = {
+    400: {"model": ErrorResponse},
+    403: {"model": ErrorResponse},
+    404: {"model": ErrorResponse},
+    409: {"model": ErrorResponse},
+    500: {"model": ErrorResponse},
+}
+
+
+async def _embedding_model_response(
+    session: SessionDep, model: EmbeddingModel
+) -> EmbeddingModelResponse:
+    staged = await session.exec(
+        select(func.count())
+        .select_from(ImageEmbedding)
+        .where(ImageEmbedding.model == model.name)
+    )
+    embedded = await session.exec(
+        select(func.count())
+        .select_from(Image)
+        .where(col(Image.embeddings).is_not(None))
+    )
+    return EmbeddingModelResponse(
+        name=model.name,
+        status=model.status,
+        staged=staged.one(),
+        embedded=embedded.one(),
+        created_at=model.created_at,
+        updated_at=model.updated_at,
+    )
+
+
+@router.get("/embedding-models", responses={403: _ERRORS[403], 500: _ERRORS[500]})
+async def list_embedding_models(
+    session: SessionDep, current_user: AdminUser
+) -> list[EmbeddingModelResponse]:
+    try:
+        result = await session.exec(
+            select(EmbeddingModel).order_by(col(EmbeddingModel.created_at).desc())
+        )
+        return [
+            await _embedding_model_response(session, model) for model in result.all()
+        ]
+
+    except Exception as e:
+        logger.error(f"Error listing embedding models: {e}")
+        raise HTTPException(
+            status_code=HTTPStatus.INTERNAL_SERVER_ERROR,
+            detail="Error listing embedding models",
+        )
+
+
+@router.post(
+    "/embedding-models",
+    responses={
+        400: _ERRORS[400],
+        403: _ERRORS[403],
+        409: _ERRORS[409],
+        500: _ERRORS[500],
+    },
+)
+async def start_embedding_model(
+    body: EmbeddingModelRequest, session: SessionDep, current_user: AdminUser
+) -> EmbeddingModelResponse:
+    """
+    Start re-embedding the library with another model. Search keeps using the
+    active model until the new one covers every embedded image.
+    """
+
+    try:
+        name = body.name.strip()
+        if not name:
+            raise HTTPException(
+                status_code=HTTPStatus.BAD_REQUEST, detail="name must not be empty"
+            )
+
+        model = await session.get(EmbeddingModel, name)
+        if model is not None and model.status == EmbeddingModelStatus.ACTIVE:
+            raise HTTPException(
+                status_code=HTTPStatus.CONFLICT, detail=f"{name} is already active"
+            )
+
+        # only one model is built at a time, abandon any other rollout
+        result = await session.exec(
+            select(EmbeddingModel).where(
+                EmbeddingModel.status == EmbeddingModelStatus.BUILDING,
+                EmbeddingModel.name != name,
+            )
+        )
+        for other in result.all():
+            other.status = EmbeddingModelStatus.RETIRED
+            other.updated_at = datetime.now()
+            session.add(other)
+            await session.exec(
+                delete(ImageEmbedding).where(col(ImageEmbedding.model) == other.name)
+            )
+
+        if model is None:
+            model = EmbeddingModel(name=name)
+        # staged rows from an earlier attempt are still valid and are kept
+        model.status = EmbeddingModelStatus.BUILDING
+        model.updated_at = datetime.now()
+        session.add(model)
+        await session.commit()
+        await session.refresh(model)
+
+        logger.info(f"User {current_user.id} started re-embedding with {name}")
+        return await _embedding_model_response(session, model)
+
+    except HTTPException as e:
+        logger.error(f"Error starting embedding model {body.name}: {e.detail}")
+        raise
+
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"Error starting embedding model {body.name}: {e}")
+        raise HTTPException(
+            status_code=HTTPStatus.INTERNAL_SERVER_ERROR,
+            detail="Error starting embedding model",
+        )
+
+
+@router.post("/jobs/missing", responses={403: _ERRORS[403], 500: _ERRORS[500]})
+async def enqueue_missing_jobs(
+    session: SessionDep, current_user: AdminUser
+) -> EnqueueResponse:
+    """
+    Queue thumbnails and embeddings for every image that lacks them, e.g. after
+    jobs failed for good. Safe to repeat, queued work is not duplicated.
+    """
+
+    try:
+        added = await enqueue_missing(session)
+        await session.commit()
+        logger.info(f"User {current_user.id} re-enqueued missing jobs: {added}")
+        return EnqueueResponse(
+            thumb=added[ServiceType.THUMB], vector=added[ServiceType.VECTOR]
+        )
+
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"Error enqueueing missing jobs: {e}")
+        raise HTTPException(
+            status_code=HTTPStatus.INTERNAL_SERVER_ERROR,
+            detail="Error enqueueing missing jobs",
+        )
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={403: _ERRORS[403]},
+)
+async def export_images(
+    current_user: AdminUser,
+    tag: str | None = None,
+    uploaded_by: UUID | None = None,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    embedded_only: bool = False,
+):
+    """
+    Stream a tar of embeddings.npy and images.jsonl for offline analysis, row
+    i of the matrix belonging to line i. Also available as
+    scripts/export_library.py.
+    """
+
+    filters = ExportFilter(
+        tag=tag.strip() if tag and tag.strip() else None,
+        uploaded_by=uploaded_by,
+        created_after=created_after,
+        created_before=created_before,
+        embedded_only=embedded_only,
+    )
+    logger.info(f"User {current_user.id} started an export: {filters}")
+    filename = f"scene-export-{datetime.now():%Y%m%d-%H%M%S}.tar"
+    return StreamingResponse(
+        export_library(filters),
+        media_type="application/x-tar",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def _profile_response(profile: Profile) -> ProfileResponse:
+    return ProfileResponse(
+        id=profile.id,
+        kind=profile.kind,
+        target=profile.target,
+        status=profile.status,
+        requested=profile.requested,
+        captured=profile.captured,
+        samples=profile.samples.total(),
+        created_at=profile.created_at,
+    )
+
+
+@router.get("/profiles", responses={403: _ERRORS[403]})
+async def list_profiles(current_user: AdminUser) -> list[ProfileResponse]:
+    return [_profile_response(profile) for profile in profiler.recent()]
+
+
+@router.post(
+    "/profiles", responses={400: _ERRORS[400], 403: _ERRORS[403], 500: _ERRORS[500]}
+)
+async def start_profile(
+    body: ProfileRequest, request: Request, current_user: AdminUser
+) -> ProfileResponse:
+    """
+    Sample-profile the next `count` requests to a route template or jobs of a
+    service type. The result is downloaded from /admin/profiles/{id}.
+    """
+
+    try:
+        if not (1 <= body.count <= MAX_PROFILE_COUNT):
+            raise HTTPException(
+                status_code=HTTPStatus.BAD_REQUEST,
+                detail=f"count must be between 1 and {MAX_PROFILE_COUNT}",
+            )
+
+        if body.kind == ProfileTarget.ROUTE:
+            routes = {
+                route.path
+                for route in request.app.routes
+                if isinstance(route, APIRoute)
+            }
+            if body.target not in routes:
+                raise HTTPException(
+                    status_code=HTTPStatus.BAD_REQUEST,
+                    detail=f"Unknown route '{body.target}'",
+                )
+        elif body.target not in ServiceType.__members__:
+            raise HTTPException(
+                status_code=HTTPStatus.BAD_REQUEST,
+                detail=f"Unknown service type '{body.target}'",
+            )
+
+        profile = profiler.arm(body.kind, body.target, body.count)
+        logger.info(
+            f"User {current_user.id} armed profile {profile.id} for "
+            f"{body.kind.value} {body.target} x{body.count}"
+        )
+        return _profile_response(profile)
+
+    except HTTPException as e:
+        logger.error(f"Error starting profile {body}: {e.detail}")
+        raise
+
+    except Exception as e:
+        logger.error(f"Error starting profile {body}: {e}")
+        raise HTTPException(
+            status_code=HTTPStatus.INTERNAL_SERVER_ERROR,
+            detail="Error starting profile",
+        )
+
+
+@router.get(
+    "/profiles/{profile_id}",
+    response_class=PlainTextResponse,
+    responses={403: _ERRORS[403], 404: _ERRORS[404]},
+)
+async def download_profile(profile_id: UUID, current_user: AdminUser):
+    """Collapsed stacks, for flamegraph.pl or speedscope. Partial while running."""
+
+    profile = profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND, detail="Profile not found"
+        )
+    return PlainTextResponse(
+        profile.folded(),
+        headers={"Content-Disposition": f'attachment; filename="{profile_id}.folded"'},
+    )
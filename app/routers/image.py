@@ -8,8 +8,11 @@ import aiofiles
 import aiofiles.os
 import uuid_utils
 from app.db import SessionDep
-from app.db.model import Image, ServiceQ
+from app.db.model import Image
 from app.db.types import (
+    BulkRequest,
+    BulkResponse,
+    CombinedSearchRequest,
     DeleteResponse,
     ErrorResponse,
     ImageMeta,
@@ -19,20 +22,39 @@ from app.db.types import (
     SimilarityListResponse,
     UploadResponse,
 )
+from app.helpers.cache import bump_generation
+from app.helpers.compact import msgpack_page, wants_msgpack
 from app.helpers.constants import (
     ALLOWED_IMAGE_EXTENSIONS,
+    COMPACT_MAX_PAGE_SIZE,
+    MAX_BULK_IDS,
+    MAX_COMBINED_TERMS,
     SIMILARITY_THRESHOLD,
     TEXT_SIMILARITY_THRESHOLD,
     UPLOAD_DIR,
 )
 from app.helpers.deps import ReadUser, WriteUser
-from app.helpers.enums import ServiceType, UserRole
+from app.helpers.embedding import active_model
+from app.helpers.enums import BulkOperation, JobPriority, ServiceType, UserRole
+from app.helpers.files import delete_later, deletions_pending, image_files
+from app.helpers.jobs import enqueue
 from app.helpers.logger import logger
 from app.helpers.presence import image_exists
-from app.worker.vector import generate_text_vector
-from fastapi import APIRouter, HTTPException, UploadFile
+from app.helpers.search import (
+    IMAGE_COLS,
+    cached_nearest,
+    combine_vectors,
+    fetch_ranked_page,
+    materialized_neighbors,
+    normalize_query,
+)
+from app.helpers.timing import timed
+from app.worker.thumb import thumb_on_demand
+from app.worker.vector import generate_text_vector, generate_text_vectors
+from fastapi import APIRouter, Header, HTTPException, UploadFile
 from fastapi.responses import FileResponse
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, IntegrityError
 from sqlmodel import func, select
 
 router = APIRouter()
@@ -47,16 +69,17 @@ _ERRORS = {
 }
 
 
-_IMAGE_COLS = (
-    Image.id,
-    Image.name,
-    Image.path,
-    Image.thumb,
-    Image.created_at,
-    Image.updated_at,
-    Image.tags,
-    Image.uploaded_by,
-)
+def _check_page(page: int, page_size: int, compact: bool) -> None:
+    max_page_size = COMPACT_MAX_PAGE_SIZE if compact else 100
+    if page < 1:
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST, detail="page must be >= 1"
+        )
+    if not (1 <= page_size <= max_page_size):
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail=f"page_size must be between 1 and {max_page_size}",
+        )
 
 
 @router.post(
@@ -69,7 +92,10 @@ _IMAGE_COLS = (
     },
 )
 async def upload_file(
-    file: UploadFile, session: SessionDep, current_user: WriteUser
+    file: UploadFile,
+    session: SessionDep,
+    current_user: WriteUser,
+    bulk: bool = False,
 ) -> UploadResponse:
     file_path = None
     try:
@@ -109,7 +135,15 @@ async def upload_file(
         session.add(image)
         await session.flush()
 
-        session.add(ServiceQ(image_id=image.id, service_type=ServiceType.THUMB))
+        # large imports opt out of the interactive lane so single uploads, and
+        # other users, are not stuck behind them
+        await enqueue(
+            session,
+            image.id,
+            ServiceType.THUMB,
+            JobPriority.BULK if bulk else JobPriority.INTERACTIVE,
+            current_user.id,
+        )
         await session.commit()
         await session.refresh(image)
 
@@ -153,17 +187,13 @@ async def list_files(
     page: int = 1,
     page_size: int = 20,
     tag: str | None = None,
+    accept: str | None = Header(default=None),
 ) -> ListResponse:
+    """Send `Accept: application/msgpack` for a compact, columnar page."""
+
     try:
-        if page < 1:
-            raise HTTPException(
-                status_code=HTTPStatus.BAD_REQUEST, detail="page must be >= 1"
-            )
-        if not (1 <= page_size <= 100):
-            raise HTTPException(
-                status_code=HTTPStatus.BAD_REQUEST,
-                detail="page_size must be between 1 and 100",
-            )
+        compact = wants_msgpack(accept)
+        _check_page(page, page_size, compact)
 
         offset = (page - 1) * page_size
         tag_filter = Image.tags.contains([tag.strip()]) if tag and tag.strip() else None  # type: ignore[attr-defined]
@@ -171,19 +201,24 @@ async def list_files(
         count_stmt = select(func.count()).select_from(Image)
         if tag_filter is not None:
             count_stmt = count_stmt.where(tag_filter)
-        count_result = await session.exec(count_stmt)
+        with timed("count"):
+            count_result = await session.exec(count_stmt)
         total = count_result.one()
 
         list_stmt = (
-            select(*_IMAGE_COLS)  # type: ignore[call-overload]
+            select(*IMAGE_COLS)  # type: ignore[call-overload]
             .order_by(Image.id.desc())  # type: ignore[attr-defined]
             .offset(offset)
             .limit(page_size)
         )
         if tag_filter is not None:
             list_stmt = list_stmt.where(tag_filter)
-        result = await session.exec(list_stmt)
-        images = [ImageMeta.model_validate(row) for row in result.mappings().all()]
+        with timed("list"):
+            result = await session.exec(list_stmt)
+        with timed("serialize"):
+            if compact:
+                return msgpack_page(page, page_size, total, result.mappings().all())
+            images = [ImageMeta.model_validate(row) for row in result.mappings().all()]
 
         return ListResponse(page=page, page_size=page_size, count=total, items=images)
 
@@ -229,6 +264,8 @@ async def update_file(
             image.name = body.name
         if body.tags is not None:
             image.tags = body.tags
+            # the user now owns every tag, a re-tag must not remove any of them
+            image.auto_tags = []
         image.updated_at = datetime.now()
 
         session.add(image)
@@ -267,26 +304,11 @@ async def delete_file(
                 detail="Only the uploader can delete this image",
             )
 
-        try:
-            await aiofiles.os.remove(image.path)
-        except FileNotFoundError:
-            logger.warning(f"Image file not found during delete: {image.path}")
-
-        thumb_path = image.thumb
-        if not thumb_path:
-            thumb_path = os.path.join(
-                UPLOAD_DIR, "thumbs", os.path.basename(image.path)
-            )
-            logger.warning(
-                f"No thumb path stored for image {image_id}, guessing: {thumb_path}"
-            )
-        try:
-            await aiofiles.os.remove(thumb_path)
-        except FileNotFoundError:
-            logger.warning(f"Thumb file not found during delete: {thumb_path}")
-
+        delete_later(session, image_files(image.path, image.thumb))
         await session.delete(image)
         await session.commit()
+        bump_generation()
+        deletions_pending.set()
         return DeleteResponse(message=f"Image {image_id} deleted")
 
     except HTTPException as e:
@@ -301,53 +323,319 @@ async def delete_file(
         )
 
 
-@router.get("/search", responses={403: _ERRORS[403], 500: _ERRORS[500]})
+# set-based edits, one UPDATE for the whole selection. tags a user edits are
+# theirs from then on, a re-tag must not add or remove them as auto tags
+_STRIP_AUTO_TAGS = """
+    auto_tags = ARRAY(
+        SELECT t FROM unnest(image.auto_tags) AS t
+        WHERE NOT t = ANY(CAST(:tags AS text[]))
+    )
+"""
+_BULK_UPDATES = {
+    BulkOperation.ADD_TAGS: f"""
+        tags = tags || ARRAY(
+            SELECT t FROM unnest(CAST(:tags AS text[])) AS t
+            WHERE NOT t = ANY(image.tags)
+        ),
+        {_STRIP_AUTO_TAGS}
+    """,
+    BulkOperation.REMOVE_TAGS: f"""
+        tags = ARRAY(
+            SELECT t FROM unnest(image.tags) AS t
+            WHERE NOT t = ANY(CAST(:tags AS text[]))
+        ),
+        {_STRIP_AUTO_TAGS}
+    """,
+    BulkOperation.SET_TAGS: "tags = CAST(:tags AS text[]), auto_tags = '{}'",
+    BulkOperation.RENAME: "name = regexp_replace(name, :pattern, :replacement, 'g')",
+}
+
+
+@router.post(
+    "/bulk",
+    responses={
+        400: _ERRORS[400],
+        403: _ERRORS[403],
+        404: _ERRORS[404],
+        500: _ERRORS[500],
+    },
+)
+async def bulk_edit(
+    body: BulkRequest,
+    session: SessionDep,
+    current_user: WriteUser,
+) -> BulkResponse:
+    try:
+        ids = list(dict.fromkeys(body.ids))
+        if not ids or len(ids) > MAX_BULK_IDS:
+            raise HTTPException(
+                status_code=HTTPStatus.BAD_REQUEST,
+                detail=f"Between 1 and {MAX_BULK_IDS} image ids are allowed",
+            )
+        tags = list(dict.fromkeys(body.tags))
+        if body.operation in (BulkOperation.ADD_TAGS, BulkOperation.REMOVE_TAGS):
+            if not tags:
+                raise HTTPException(
+                    status_code=HTTPStatus.BAD_REQUEST,
+                    detail=f"{body.operation.value} needs at least one tag",
+                )
+        if body.operation == BulkOperation.RENAME and not body.pattern:
+            raise HTTPException(
+                status_code=HTTPStatus.BAD_REQUEST,
+                detail="RENAME needs a pattern",
+            )
+
+        # one query checks existence and ownership of the whole selection, and
+        # locks it so nothing changes hands before the edit below. locking in id
+        # order keeps overlapping bulk requests from deadlocking
+        found, foreign = (
+            await session.exec(
+                text("""
+                    SELECT count(*), count(*) FILTER (
+                        WHERE uploaded_by IS DISTINCT FROM :user_id
+                    )
+                    FROM (
+                        SELECT uploaded_by FROM image
+                        WHERE id = ANY(:ids)
+                        ORDER BY id
+                        FOR UPDATE
+                    ) selected
+                """).bindparams(ids=ids, user_id=current_user.id)
+            )
+        ).one()
+        if found < len(ids):
+            raise HTTPException(
+                status_code=HTTPStatus.NOT_FOUND,
+                detail=f"{len(ids) - found} of the images were not found",
+            )
+        if current_user.role != UserRole.ADMIN and foreign:
+            raise HTTPException(
+                status_code=HTTPStatus.FORBIDDEN,
+                detail=f"Only the uploader can edit an image, {foreign} are not yours",
+            )
+
+        if body.operation == BulkOperation.DELETE:
+            result = await session.exec(
+                text("""
+                    DELETE FROM image WHERE id = ANY(:ids)
+                    RETURNING path, thumb
+                """).bindparams(ids=ids)
+            )
+            delete_later(
+                session,
+                [file for row in result.all() for file in image_files(*row)],
+            )
+            await session.commit()
+            bump_generation()
+            deletions_pending.set()
+            return BulkResponse(operation=body.operation, affected=found)
+
+        params = {"ids": ids}
+        if body.operation == BulkOperation.RENAME:
+            params |= {"pattern": body.pattern, "replacement": body.replacement}
+        else:
+            params["tags"] = tags
+        result = await session.exec(
+            text(f"""
+                UPDATE image
+                SET {_BULK_UPDATES[body.operation]}, updated_at = NOW()
+                WHERE id = ANY(:ids)
+            """).bindparams(**params)
+        )
+        await session.commit()
+        return BulkResponse(operation=body.operation, affected=result.rowcount)
+
+    except HTTPException as e:
+        logger.error(f"Error in bulk {body.operation.value}: {e.detail}")
+        raise
+
+    except DBAPIError as e:
+        logger.error(f"Error in bulk {body.operation.value}: {e}")
+        # 2201B is invalid_regular_expression, a bad RENAME pattern
+        if getattr(e.orig, "sqlstate", None) == "2201B":
+            raise HTTPException(
+                status_code=HTTPStatus.BAD_REQUEST,
+                detail="Invalid pattern",
+            )
+        raise HTTPException(
+            status_code=HTTPStatus.INTERNAL_SERVER_ERROR,
+            detail="Error editing images",
+        )
+
+    except Exception as e:
+        logger.error(f"Error in bulk {body.operation.value}: {e}")
+        raise HTTPException(
+            status_code=HTTPStatus.INTERNAL_SERVER_ERROR,
+            detail="Error editing images",
+        )
+
+
+@router.get(
+    "/search", responses={400: _ERRORS[400], 403: _ERRORS[403], 500: _ERRORS[500]}
+)
 async def search_images(
     query: str,
     session: SessionDep,
     current_user: ReadUser,
     page: int = 1,
     page_size: int = 10,
+    accept: str | None = Header(default=None),
 ) -> SimilarityListResponse:
     try:
-        text_embeddings = await asyncio.to_thread(generate_text_vector, query)
-        distance = Image.embeddings.cosine_distance(text_embeddings)  # type: ignore[attr-defined]
-        similarity = (1 - distance).label("similarity")
-
-        count_result = await session.exec(
-            select(func.count())
-            .select_from(Image)
-            .where(distance < TEXT_SIMILARITY_THRESHOLD)
+        _check_page(page, page_size, wants_msgpack(accept))
+        model_name = await active_model(session)
+        ranked = await cached_nearest(
+            session,
+            ("text", normalize_query(query)),
+            lambda: asyncio.to_thread(generate_text_vector, query, model_name),
+            TEXT_SIMILARITY_THRESHOLD,
+        )
+        offset = (page - 1) * page_size
+        total = len(ranked)
+        rows = await fetch_ranked_page(session, ranked[offset : offset + page_size])
+        with timed("serialize"):
+            if wants_msgpack(accept):
+                return msgpack_page(page, page_size, total, rows, similarity=True)
+            items = [
+                ImageWithSimilarity.model_validate(
+                    {
+                        **row,
+                        "similarity": round(float(row["similarity"]), 4),
+                    }
+                )
+                for row in rows
+            ]
+        return SimilarityListResponse(
+            page=page, page_size=page_size, count=total, items=items
         )
-        total = count_result.one()
 
-        results = await session.exec(
-            select(*_IMAGE_COLS, similarity)  # type: ignore[call-overload]
-            .where(distance < TEXT_SIMILARITY_THRESHOLD)
-            .order_by(distance, Image.id.desc())  # type: ignore[attr-defined]
-            .offset((page - 1) * page_size)
-            .limit(page_size)
+    except HTTPException as e:
+        logger.error(f"Error searching images {query}: {e.detail}")
+        raise
+
+    except Exception as e:
+        logger.error(f"Error searching images {query}: {e}")
+        raise HTTPException(
+            status_code=HTTPStatus.INTERNAL_SERVER_ERROR,
+            detail="Error searching images",
         )
-        rows = results.mappings().all()
-        items = [
-            ImageWithSimilarity.model_validate(
-                {
-                    **row,
-                    "similarity": round(float(row["similarity"]), 4),
-                }
+
+
+@router.post(
+    "/search/combined",
+    responses={
+        400: _ERRORS[400],
+        403: _ERRORS[403],
+        404: _ERRORS[404],
+        422: _ERRORS[422],
+        500: _ERRORS[500],
+    },
+)
+async def search_combined(
+    body: CombinedSearchRequest,
+    session: SessionDep,
+    current_user: ReadUser,
+    page: int = 1,
+    page_size: int = 10,
+    accept: str | None = Header(default=None),
+) -> SimilarityListResponse:
+    try:
+        _check_page(page, page_size, wants_msgpack(accept))
+        positive = [q for q in map(normalize_query, body.positive) if q]
+        negative = [q for q in map(normalize_query, body.negative) if q]
+        positive_images = list(dict.fromkeys(body.positive_images))
+        negative_images = list(dict.fromkeys(body.negative_images))
+        image_ids = positive_images + negative_images
+
+        if not positive and not positive_images:
+            raise HTTPException(
+                status_code=HTTPStatus.BAD_REQUEST,
+                detail="At least one positive query or image is required",
+            )
+        if len(positive) + len(negative) + len(image_ids) > MAX_COMBINED_TERMS:
+            raise HTTPException(
+                status_code=HTTPStatus.BAD_REQUEST,
+                detail=f"At most {MAX_COMBINED_TERMS} queries and images are allowed",
+            )
+
+        async def combined_vector() -> list[float]:
+            texts = positive + negative
+            text_vectors = (
+                await asyncio.to_thread(
+                    generate_text_vectors, texts, await active_model(session)
+                )
+                if texts
+                else []
             )
-            for row in rows
-        ]
+
+            image_vectors = {}
+            if image_ids:
+                result = await session.exec(
+                    select(Image.id, Image.embeddings).where(Image.id.in_(image_ids))  # type: ignore[call-overload, attr-defined]
+                )
+                image_vectors = {row[0]: row[1] for row in result.all()}
+            for id_ in image_ids:
+                if id_ not in image_vectors:
+                    raise HTTPException(
+                        status_code=HTTPStatus.NOT_FOUND,
+                        detail=f"Image {id_} not found",
+                    )
+                if image_vectors[id_] is None:
+                    raise HTTPException(
+                        status_code=HTTPStatus.UNPROCESSABLE_ENTITY,
+                        detail=f"Image {id_} has not been embedded yet",
+                    )
+
+            return combine_vectors(
+                text_vectors[: len(positive)]
+                + [image_vectors[id_].to_list() for id_ in positive_images],
+                text_vectors[len(positive) :]
+                + [image_vectors[id_].to_list() for id_ in negative_images],
+            )
+
+        # text matches score far lower than image matches, so any text term
+        # switches to the looser text threshold
+        threshold = (
+            TEXT_SIMILARITY_THRESHOLD if positive or negative else SIMILARITY_THRESHOLD
+        )
+        ranked = await cached_nearest(
+            session,
+            (
+                "combined",
+                tuple(sorted(positive)),
+                tuple(sorted(negative)),
+                frozenset(positive_images),
+                frozenset(negative_images),
+            ),
+            combined_vector,
+            threshold,
+            exclude_ids=image_ids,
+        )
+        offset = (page - 1) * page_size
+        total = len(ranked)
+        rows = await fetch_ranked_page(session, ranked[offset : offset + page_size])
+        with timed("serialize"):
+            if wants_msgpack(accept):
+                return msgpack_page(page, page_size, total, rows, similarity=True)
+            items = [
+                ImageWithSimilarity.model_validate(
+                    {
+                        **row,
+                        "similarity": round(float(row["similarity"]), 4),
+                    }
+                )
+                for row in rows
+            ]
         return SimilarityListResponse(
             page=page, page_size=page_size, count=total, items=items
         )
 
     except HTTPException as e:
-        logger.error(f"Error searching images {query}: {e.detail}")
+        logger.error(f"Error in combined search {body}: {e.detail}")
         raise
 
     except Exception as e:
-        logger.error(f"Error searching images {query}: {e}")
+        logger.error(f"Error in combined search {body}: {e}")
         raise HTTPException(
             status_code=HTTPStatus.INTERNAL_SERVER_ERROR,
             detail="Error searching images",
@@ -396,14 +684,19 @@ async def get_thumb(
                 status_code=HTTPStatus.NOT_FOUND, detail="Image not found"
             )
 
-        if not image.thumb:
-            return FileResponse(
-                image.path,
-                headers={"Cache-Control": "public, max-age=31536000, immutable"},
-            )
+        thumb_path = image.thumb
+        if not thumb_path:
+            try:
+                thumb_path = await thumb_on_demand(image.id, image.path)
+            except Exception as e:
+                # a file PIL cannot thumbnail is served as it is
+                logger.warning(
+                    f"Could not make thumb {image_id}, serving original: {e}"
+                )
+                thumb_path = image.path
 
         return FileResponse(
-            image.thumb,
+            thumb_path,
             headers={"Cache-Control": "public, max-age=31536000, immutable"},
         )
 
@@ -421,7 +714,12 @@ async def get_thumb(
 
 @router.get(
     "/{image_id}/similar",
-    responses={404: _ERRORS[404], 422: _ERRORS[422], 500: _ERRORS[500]},
+    responses={
+        400: _ERRORS[400],
+        404: _ERRORS[404],
+        422: _ERRORS[422],
+        500: _ERRORS[500],
+    },
 )
 async def get_similar(
     image_id: UUID,
@@ -429,9 +727,12 @@ async def get_similar(
     current_user: ReadUser,
     page: int = 1,
     page_size: int = 10,
+    accept: str | None = Header(default=None),
 ) -> SimilarityListResponse:
     try:
-        image = await session.get(Image, image_id)
+        _check_page(page, page_size, wants_msgpack(accept))
+        with timed("load"):
+            image = await session.get(Image, image_id)
         if not image:
             raise HTTPException(
                 status_code=HTTPStatus.NOT_FOUND, detail="Image not found"
@@ -443,33 +744,37 @@ async def get_similar(
                 detail="Image has not been embedded yet",
             )
 
-        distance = Image.embeddings.cosine_distance(image.embeddings)  # type: ignore[attr-defined]
-        similarity = (1 - distance).label("similarity")
-
-        count_result = await session.exec(
-            select(func.count())
-            .select_from(Image)
-            .where(distance < SIMILARITY_THRESHOLD)
-        )
-        total = count_result.one()
-
-        results = await session.exec(
-            select(*_IMAGE_COLS, similarity)  # type: ignore[call-overload]
-            .where(distance < SIMILARITY_THRESHOLD)
-            .order_by(distance, Image.id.desc())  # type: ignore[attr-defined]
-            .offset((page - 1) * page_size)
-            .limit(page_size)
-        )
-        rows = results.mappings().all()
-        items = [
-            ImageWithSimilarity.model_validate(
-                {
-                    **row,
-                    "similarity": round(float(row["similarity"]), 4),
-                }
+        offset = (page - 1) * page_size
+        if image.neighbors_updated_at is not None:
+            total, rows = await materialized_neighbors(
+                session, image_id, offset=offset, limit=page_size
+            )
+        else:
+            # neighbour list not materialized yet, search live
+            async def source_vector():
+                return image.embeddings
+
+            ranked = await cached_nearest(
+                session,
+                ("image", image_id),
+                source_vector,
+                SIMILARITY_THRESHOLD,
+                exclude_ids=(image_id,),
             )
-            for row in rows
-        ]
+            total = len(ranked)
+            rows = await fetch_ranked_page(session, ranked[offset : offset + page_size])
+        with timed("serialize"):
+            if wants_msgpack(accept):
+                return msgpack_page(page, page_size, total, rows, similarity=True)
+            items = [
+                ImageWithSimilarity.model_validate(
+                    {
+                        **row,
+                        "similarity": round(float(row["similarity"]), 4),
+                    }
+                )
+                for row in rows
+            ]
         return SimilarityListResponse(
             page=page, page_size=page_size, count=total, items=items
         )
@@ -0,0 +1,80 @@
+from app.db import SessionDep, engine
+from app.helpers.cache import library_generation, search_cache
+from app.helpers.enums import ServiceStatus, ServiceType
+from app.helpers.metrics import QUEUE_DEPTH
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+from sqlalchemy import text
+
+router = APIRouter()
+
+
+class _StateCollector(Collector):
+    """Reads in-process state (search cache, connection pool) at scrape time."""
+
+    def collect(self):
+        yield CounterMetricFamily(
+            "scene_search_cache_hits", "Search cache hits", value=search_cache.hits
+        )
+        yield CounterMetricFamily(
+            "scene_search_cache_misses",
+            "Search cache misses",
+            value=search_cache.misses,
+        )
+        yield GaugeMetricFamily(
+            "scene_search_cache_entries",
+            "Ranked lists held in the search cache",
+            value=len(search_cache),
+        )
+        yield GaugeMetricFamily(
+            "scene_library_generation",
+            "Bumped whenever the searchable embeddings change",
+            value=library_generation(),
+        )
+
+        pool = engine.pool
+        yield GaugeMetricFamily(
+            "scene_db_pool_size", "Configured pool size", value=pool.size()
+        )
+        yield GaugeMetricFamily(
+            "scene_db_pool_checked_out",
+            "Connections currently checked out",
+            value=pool.checkedout(),
+        )
+        yield GaugeMetricFamily(
+            "scene_db_pool_checked_in",
+            "Idle connections in the pool",
+            value=pool.checkedin(),
+        )
+        yield GaugeMetricFamily(
+            "scene_db_pool_overflow",
+            "Connections open beyond the pool size (negative while below it)",
+            value=pool.overflow(),
+        )
+
+
+REGISTRY.register(_StateCollector())
+
+
+async def _sample_queue_depth(session: SessionDep) -> None:
+    result = await session.exec(
+        text("""
+            SELECT service_type, status, count(*)
+            FROM serviceq
+            GROUP BY service_type, status
+        """)
+    )
+    counts = {(row[0], row[1]): row[2] for row in result.all()}
+    for service_type in ServiceType:
+        for status in ServiceStatus:
+            QUEUE_DEPTH.labels(service_type.value, status.value).set(
+                counts.get((service_type.value, status.value), 0)
+            )
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics(session: SessionDep):
+    await _sample_queue_depth(session)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,134 @@
+import json
+import logging
+import threading
+
+import numpy as np
+from sqlalchemy import text
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.db.model import Image
+from app.helpers.constants import (
+    AUTOTAG_BATCH_SIZE,
+    AUTOTAG_LOGIT_SCALE,
+    AUTOTAG_MAX_TAGS,
+    AUTOTAG_MIN_PROBABILITY,
+    AUTOTAG_PROMPT,
+    AUTOTAG_VOCABULARY,
+    CLIP_MODEL,
+)
+from app.worker.vector import generate_text_vectors
+
+logger = logging.getLogger("worker.autotag")
+
+_lock = threading.Lock()
+# text embeddings of the vocabulary per model, (len(vocabulary), EMBEDDING_DIM)
+_vocabularies: dict[str, np.ndarray] = {}
+
+
+def _vocabulary(model_name: str) -> np.ndarray:
+    if model_name not in _vocabularies:
+        with _lock:
+            if model_name not in _vocabularies:
+                prompts = [AUTOTAG_PROMPT.format(tag) for tag in AUTOTAG_VOCABULARY]
+                _vocabularies[model_name] = np.asarray(
+                    generate_text_vectors(prompts, model_name), dtype=np.float32
+                )
+                logger.info(
+                    "[AUTOTAG] Embedded %d tags for %s", len(prompts), model_name
+                )
+    return _vocabularies[model_name]
+
+
+def score_tags(embeddings: np.ndarray, model_name: str = CLIP_MODEL) -> list[list[str]]:
+    """
+    Zero-shot tags for a batch of normalized image embeddings, (n, dim), from
+    one matrix multiply against the vocabulary. Each image gets the most likely
+    tags, at most AUTOTAG_MAX_TAGS, above AUTOTAG_MIN_PROBABILITY.
+    """
+
+    logits = AUTOTAG_LOGIT_SCALE * (embeddings @ _vocabulary(model_name).T)
+    logits -= logits.max(axis=1, keepdims=True)
+    probabilities = np.exp(logits)
+    probabilities /= probabilities.sum(axis=1, keepdims=True)
+
+    top = np.argsort(-probabilities, axis=1)[:, :AUTOTAG_MAX_TAGS]
+    return [
+        [
+            AUTOTAG_VOCABULARY[j]
+            for j in row
+            if probabilities[i, j] >= AUTOTAG_MIN_PROBABILITY
+        ]
+        for i, row in enumerate(top)
+    ]
+
+
+def merge_tags(
+    tags: list[str], old_auto: list[str], new_auto: list[str]
+) -> tuple[list[str], list[str]]:
+    """
+    Replace the previous auto tags, keeping every tag set another way. Returns
+    the tags and the new auto tags, which leave out tags the image already had
+    from a user or the detector, so a later re-tag does not remove those.
+    """
+
+    kept = [tag for tag in tags if tag not in old_auto]
+    added = [tag for tag in dict.fromkeys(new_auto) if tag not in kept]
+    return [*kept, *added], added
+
+
+async def retag_library(
+    session: AsyncSession, batch_size: int = AUTOTAG_BATCH_SIZE
+) -> int:
+    """
+    Re-tag every embedded image, e.g. after the vocabulary changed. Works
+    through the library in id order, one transaction and one UPDATE per batch.
+    Returns the number of images tagged.
+    """
+
+    tagged = 0
+    last_id = None
+    while True:
+        query = (
+            select(
+                Image.id,
+                Image.embeddings,
+                Image.embedding_model,
+                Image.tags,
+                Image.auto_tags,
+            )
+            .where(col(Image.embeddings).is_not(None))
+            .order_by(Image.id)
+            .limit(batch_size)
+            .with_for_update()
+        )
+        if last_id is not None:
+            query = query.where(Image.id > last_id)
+        rows = (await session.exec(query)).all()
+        if not rows:
+            return tagged
+
+        updates = []
+        # a rollout can leave images embedded by different models for a while
+        for model_name in {row[2] or CLIP_MODEL for row in rows}:
+            batch = [row for row in rows if (row[2] or CLIP_MODEL) == model_name]
+            matrix = np.asarray([row[1].to_list() for row in batch], dtype=np.float32)
+            for row, auto in zip(batch, score_tags(matrix, model_name)):
+                tags, auto_tags = merge_tags(row[3], row[4], auto)
+                updates.append(
+                    {"id": str(row[0]), "tags": tags, "auto_tags": auto_tags}
+                )
+
+        await session.exec(
+            text("""
+                UPDATE image
+                SET tags = r.tags, auto_tags = r.auto_tags
+                FROM jsonb_to_recordset(CAST(:rows AS jsonb))
+                    AS r(id uuid, tags text[], auto_tags text[])
+                WHERE image.id = r.id
+            """).bindparams(rows=json.dumps(updates))
+        )
+        await session.commit()
+        tagged += len(rows)
+        last_id = rows[-1][0]
+        logger.info("[AUTOTAG] Re-tagged %d images", tagged)
@@ -0,0 +1,91 @@
+import logging
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.db.model import Image
+from app.helpers.constants import NEIGHBORS_K, SIMILARITY_THRESHOLD
+from app.helpers.search import nearest_neighbors
+
+logger = logging.getLogger("worker.neighbors")
+
+
+async def update_neighbors(session: AsyncSession, image: Image) -> None:
+    """
+    Materialize the top NEIGHBORS_K neighbours of the image and patch the lists
+    of already materialized images that the new image is now closer to.
+    Cosine similarity is symmetric, so the reverse edges need no extra search.
+    """
+
+    neighbors = await nearest_neighbors(
+        session, image.embeddings, SIMILARITY_THRESHOLD, exclude_ids=(image.id,)
+    )
+    params = {
+        "image_id": image.id,
+        "neighbor_ids": [n for n, _ in neighbors],
+        "similarities": [s for _, s in neighbors],
+        "k": NEIGHBORS_K,
+    }
+
+    await session.exec(
+        text("DELETE FROM imageneighbor WHERE image_id = :image_id").bindparams(
+            image_id=image.id
+        )
+    )
+    await session.exec(
+        text("""
+            INSERT INTO imageneighbor (image_id, neighbor_id, similarity)
+            SELECT :image_id, n.neighbor_id, n.similarity
+            FROM unnest(CAST(:neighbor_ids AS uuid[]), CAST(:similarities AS float8[]))
+                AS n(neighbor_id, similarity)
+            ORDER BY n.similarity DESC
+            LIMIT :k
+        """).bindparams(**params)
+    )
+
+    # offer the new image to every candidate that already has a list, then trim
+    # those lists back to k. candidates whose k-th entry is closer drop it again.
+    await session.exec(
+        text("""
+            INSERT INTO imageneighbor (image_id, neighbor_id, similarity)
+            SELECT n.neighbor_id, :image_id, n.similarity
+            FROM unnest(CAST(:neighbor_ids AS uuid[]), CAST(:similarities AS float8[]))
+                AS n(neighbor_id, similarity)
+            JOIN image ON image.id = n.neighbor_id
+            WHERE image.neighbors_updated_at IS NOT NULL
+            ON CONFLICT (image_id, neighbor_id)
+                DO UPDATE SET similarity = EXCLUDED.similarity
+        """).bindparams(
+            image_id=image.id,
+            neighbor_ids=params["neighbor_ids"],
+            similarities=params["similarities"],
+        )
+    )
+    await session.exec(
+        text("""
+            DELETE FROM imageneighbor
+            USING (
+                SELECT image_id, neighbor_id,
+                       row_number() OVER (
+                           PARTITION BY image_id
+                           ORDER BY similarity DESC, neighbor_id DESC
+                       ) AS rank
+                FROM imageneighbor
+                WHERE image_id = ANY(CAST(:neighbor_ids AS uuid[]))
+            ) ranked
+            WHERE imageneighbor.image_id = ranked.image_id
+              AND imageneighbor.neighbor_id = ranked.neighbor_id
+              AND ranked.rank > :k
+        """).bindparams(neighbor_ids=params["neighbor_ids"], k=NEIGHBORS_K)
+    )
+
+    image.neighbors_updated_at = datetime.now()
+    session.add(image)
+
+    logger.info(
+        "[NEIGHBORS] image_id=%s materialized %d neighbours (%d candidates)",
+        image.id,
+        min(len(neighbors), NEIGHBORS_K),
+        len(neighbors),
+    )
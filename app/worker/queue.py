@@ -1,64 +1,155 @@
 import asyncio
 import logging
-import os
-from datetime import datetime
+import time
 from uuid import UUID
 
 from sqlalchemy import text
-from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.db import async_session
-from app.db.model import Image, ServiceQ
-from app.helpers.constants import MAX_CONCURRENT_JOBS, POLL_INTERVAL
-from app.helpers.enums import ServiceStatus, ServiceType
-from app.worker.detect import detect_objects
-from app.worker.thumb import generate_thumb
-from app.worker.vector import generate_vector
+from app.db.model import Image
+from app.helpers.constants import (
+    JOB_HEARTBEAT_INTERVAL,
+    JOB_LEASE_SECONDS,
+    MAX_CONCURRENT_JOBS,
+    POLL_INTERVAL,
+    REAP_INTERVAL,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+)
+from app.helpers.enums import ProfileTarget
+from app.helpers.metrics import JOB_ATTEMPTS, JOB_DURATION
+from app.helpers.profiling import profiler
+from app.worker.stages import enqueue_successors, get_stage
 
 logger = logging.getLogger("worker")
 
 _sem = asyncio.Semaphore(MAX_CONCURRENT_JOBS)
 
 
-async def _dequeue(session: AsyncSession) -> dict | None:
-    """Atomically claim the next pending job. Returns the row or None."""
+# ready PENDING jobs, shared by the queries below
+_READY = """
+    status = 'PENDING' AND run_after <= NOW() AND attempts < max_attempts
+"""
+
+
+async def _pick_queue(session: AsyncSession) -> tuple[int, UUID | None] | None:
+    """
+    Choose whose job runs next: the most urgent priority with ready jobs and,
+    within it, the uploader with the fewest jobs running, so one large import
+    cannot starve everyone else's uploads. Uploaders are enumerated with a
+    skip scan of ix_serviceq_pending, one index probe each. Jobs without an
+    uploader share one extra slot.
+    """
 
     result = await session.exec(
-        text("""
-        WITH next_job AS (
-            SELECT id FROM serviceq
-            WHERE status = 'PENDING'
-              AND attempts < max_attempts
-            ORDER BY created_at
+        text(f"""
+        WITH RECURSIVE top AS (
+            SELECT priority FROM serviceq
+            WHERE {_READY}
+            ORDER BY priority
             LIMIT 1
-            FOR UPDATE SKIP LOCKED
+        ),
+        uploaders AS (
+            (
+                SELECT q.uploaded_by FROM serviceq q, top
+                WHERE {_READY} AND q.priority = top.priority
+                  AND q.uploaded_by IS NOT NULL
+                ORDER BY q.uploaded_by
+                LIMIT 1
+            )
+            UNION ALL
+            SELECT nxt.uploaded_by FROM uploaders u, top, LATERAL (
+                SELECT q.uploaded_by FROM serviceq q
+                WHERE {_READY} AND q.priority = top.priority
+                  AND q.uploaded_by > u.uploaded_by
+                ORDER BY q.uploaded_by
+                LIMIT 1
+            ) nxt
+        ),
+        candidates AS (
+            SELECT uploaded_by FROM uploaders
+            UNION ALL
+            SELECT NULL FROM top WHERE EXISTS (
+                SELECT 1 FROM serviceq q
+                WHERE {_READY} AND q.priority = top.priority
+                  AND q.uploaded_by IS NULL
+            )
         )
-        UPDATE serviceq
-        SET status = 'RUNNING',
-            attempts = attempts + 1,
-            updated_at = NOW()
-        FROM next_job
-        WHERE serviceq.id = next_job.id
-        RETURNING serviceq.id, serviceq.image_id, serviceq.service_type,
-                  serviceq.attempts, serviceq.max_attempts
+        SELECT top.priority, c.uploaded_by
+        FROM candidates c, top
+        ORDER BY (
+            SELECT count(*) FROM serviceq r
+            WHERE r.status = 'RUNNING'
+              AND r.uploaded_by IS NOT DISTINCT FROM c.uploaded_by
+        ), random()
+        LIMIT 1
     """)
     )
-    await session.commit()
     row = result.fetchone()
-    if row is None:
-        return None
-    return {
-        "id": row[0],
-        "image_id": row[1],
-        "service_type": row[2],
-        "attempts": row[3],
-        "max_attempts": row[4],
-    }
-
-
-async def _mark_done(session: AsyncSession, job_id: UUID, success: bool) -> None:
-    await session.exec(
+    return None if row is None else (row[0], row[1])
+
+
+async def _dequeue(session: AsyncSession) -> dict | None:
+    """Atomically claim the next pending job. Returns the row or None."""
+
+    # a chosen uploader's last ready job can be claimed by another worker
+    # between the two statements, in which case the choice is made again
+    for _ in range(3):
+        picked = await _pick_queue(session)
+        if picked is None:
+            await session.commit()
+            return None
+        priority, uploaded_by = picked
+        owner = "uploaded_by IS NULL" if uploaded_by is None else "uploaded_by = :owner"
+        claim = text(f"""
+            WITH next_job AS (
+                SELECT id FROM serviceq
+                WHERE {_READY} AND priority = :priority AND {owner}
+                ORDER BY run_after
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE serviceq
+            SET status = 'RUNNING',
+                attempts = attempts + 1,
+                locked_until = NOW() + make_interval(secs => :lease),
+                updated_at = NOW()
+            FROM next_job
+            WHERE serviceq.id = next_job.id
+            RETURNING serviceq.id, serviceq.image_id, serviceq.service_type,
+                      serviceq.attempts, serviceq.max_attempts,
+                      serviceq.priority, serviceq.uploaded_by
+        """).bindparams(priority=priority, lease=JOB_LEASE_SECONDS)
+        if uploaded_by is not None:
+            claim = claim.bindparams(owner=uploaded_by)
+        result = await session.exec(claim)
+        await session.commit()
+        row = result.fetchone()
+        if row is not None:
+            return {
+                "id": row[0],
+                "image_id": row[1],
+                "service_type": row[2],
+                "attempts": row[3],
+                "max_attempts": row[4],
+                "priority": row[5],
+                "uploaded_by": row[6],
+            }
+    return None
+
+
+async def _mark_done(
+    session: AsyncSession, job: dict, success: bool, error: str | None = None
+) -> bool:
+    """
+    Finish a job. A failed job with attempts left goes back to PENDING but is
+    not retried before an exponentially growing, jittered delay. Returns False
+    if the job's lease was lost, i.e. it was reaped and claimed again, in which
+    case nothing is changed.
+    """
+
+    result = await session.exec(
         text("""
             UPDATE serviceq
             SET status = CASE
@@ -66,88 +157,132 @@ async def _mark_done(session: AsyncSession, job_id: UUID, success: bool) -> None
                 WHEN attempts >= max_attempts THEN 'FAILED'::servicestatus
                 ELSE 'PENDING'::servicestatus
             END,
+            run_after = CASE
+                WHEN :success THEN run_after
+                ELSE NOW() + make_interval(secs =>
+                    LEAST(:max_delay, :base_delay * power(2, attempts - 1))
+                    * (0.5 + random() / 2))
+            END,
+            last_error = COALESCE(:error, last_error),
+            locked_until = NULL,
+            updated_at = NOW()
+            WHERE id = :id AND status = 'RUNNING' AND attempts = :attempts
+        """).bindparams(
+            success=success,
+            error=error,
+            base_delay=RETRY_BASE_DELAY,
+            max_delay=RETRY_MAX_DELAY,
+            id=job["id"],
+            attempts=job["attempts"],
+        )
+    )
+    return result.rowcount == 1
+
+
+async def _heartbeat(job: dict) -> None:
+    """Keep renewing the lease of a running job until cancelled."""
+
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_INTERVAL)
+        try:
+            async with async_session() as session:
+                await session.exec(
+                    text("""
+                        UPDATE serviceq
+                        SET locked_until = NOW() + make_interval(secs => :lease)
+                        WHERE id = :id AND status = 'RUNNING'
+                          AND attempts = :attempts
+                    """).bindparams(
+                        lease=JOB_LEASE_SECONDS,
+                        id=job["id"],
+                        attempts=job["attempts"],
+                    )
+                )
+                await session.commit()
+        except Exception:
+            logger.exception("Failed to renew lease of job %s", job["id"])
+
+
+async def _reap_expired(session: AsyncSession) -> int:
+    """
+    Return RUNNING jobs whose lease has lapsed, e.g. after a crash or redeploy,
+    to PENDING. The lost run counts as an attempt.
+    """
+
+    result = await session.exec(
+        text("""
+            UPDATE serviceq
+            SET status = CASE
+                WHEN attempts >= max_attempts THEN 'FAILED'::servicestatus
+                ELSE 'PENDING'::servicestatus
+            END,
+            locked_until = NULL,
+            last_error = 'lease expired',
             updated_at = NOW()
-            WHERE id = :id
-        """).bindparams(success=success, id=job_id)
+            WHERE status = 'RUNNING' AND locked_until < NOW()
+        """)
     )
+    await session.commit()
+    return result.rowcount
+
+
+def _observe_job(job: dict, started: float, outcome: str) -> None:
+    service_type = str(job["service_type"])
+    JOB_DURATION.labels(service_type, outcome).observe(time.perf_counter() - started)
+    JOB_ATTEMPTS.labels(service_type, outcome).observe(job["attempts"])
 
 
 async def _handle_job(job: dict) -> None:
     async with _sem:
-        async with async_session() as session:
-            try:
-                match job["service_type"]:
-                    case ServiceType.THUMB:
-                        image = await session.get(Image, job["image_id"])
-                        if image is None:
-                            raise ValueError(
-                                f"THUMB: Image {job['image_id']} not found"
-                            )
-                        thumb_path = await asyncio.to_thread(generate_thumb, image.path)
-                        # if the image was deleted while the thumb was being generated, remove the file too.
-                        exists_result = await session.exec(
-                            select(Image.id).where(Image.id == job["image_id"])
-                        )
-                        if exists_result.first() is None:
-                            try:
-                                await asyncio.to_thread(os.remove, thumb_path)
-                            except FileNotFoundError:
-                                pass
-                            return
-                        image.thumb = thumb_path
-                        image.updated_at = datetime.now()
-                        session.add(image)
-                        session.add(
-                            ServiceQ(
-                                image_id=job["image_id"],
-                                service_type=ServiceType.VECTOR,
-                                status=ServiceStatus.PENDING,
-                            )
-                        )
-                        await _mark_done(session, job["id"], success=True)
-                        await session.commit()
+        started = time.perf_counter()
+        outcome = "completed"
+        heartbeat = asyncio.create_task(_heartbeat(job))
+        with profiler.capture(ProfileTarget.JOB, str(job["service_type"])):
+            async with async_session() as session:
+                try:
+                    stage = get_stage(job["service_type"])
+                    if stage is None:
+                        logger.warning("Unknown service_type: %s", job["service_type"])
                         return
 
-                    case ServiceType.VECTOR:
-                        image = await session.get(Image, job["image_id"])
-                        if image is None:
-                            raise ValueError(
-                                f"VECTOR: Image {job['image_id']} not found"
-                            )
-                        if image.thumb is None:
-                            raise ValueError(
-                                f"VECTOR: Image {job['image_id']} has no thumbnail yet"
-                            )
-                        embeddings = await asyncio.to_thread(
-                            generate_vector, image.thumb
+                    image = await session.get(Image, job["image_id"])
+                    if image is None:
+                        raise ValueError(
+                            f"{job['service_type']}: Image {job['image_id']} not found"
                         )
-                        image.embeddings = embeddings
-                        image.updated_at = datetime.now()
-                        session.add(image)
-
-                        # TODO: add a new serviceq for the detector
-
-                        await _mark_done(session, job["id"], success=True)
-                        await session.commit()
+                    if not await stage.handler(session, image, job):
                         return
 
-                    case ServiceType.DETECTOR:
-                        await asyncio.to_thread(detect_objects, job)
-                        await _mark_done(session, job["id"], success=True)
-                        await session.commit()
+                    # `attempts` fences the lease: a job reaped and claimed
+                    # again meanwhile belongs to the other worker now
+                    if not await _mark_done(session, job, success=True):
+                        outcome = "lost"
+                        logger.warning("Lost the lease of job %s, dropping it", job)
+                        await session.rollback()
                         return
+                    await enqueue_successors(session, job)
+                    await session.commit()
+                    if stage.after_commit is not None:
+                        stage.after_commit()
 
-                    case _:
-                        logger.warning("Unknown service_type: %s", job["service_type"])
+                except Exception as e:
+                    outcome = "failed"
+                    logger.exception("Job failed: %s", job)
+                    try:
+                        await session.rollback()
+                        await _mark_done(
+                            session,
+                            job,
+                            success=False,
+                            error=f"{type(e).__name__}: {e}"[:1000],
+                        )
+                        await session.commit()
+                    except Exception:
+                        logger.exception("Failed to mark job as done: %s", job["id"])
 
-            except Exception:
-                logger.exception("Job failed: %s", job)
-                try:
-                    await session.rollback()
-                    await _mark_done(session, job["id"], success=False)
-                    await session.commit()
-                except Exception:
-                    logger.exception("Failed to mark job as done: %s", job["id"])
+                finally:
+                    heartbeat.cancel()
+                    _observe_job(job, started, outcome)
 
 
 _tasks: set[asyncio.Task] = set()
@@ -157,17 +292,24 @@ async def start_worker() -> None:
     """Poll the DB and dispatch jobs. Runs until cancelled."""
 
     logger.info(
-        "Worker started (poll_interval=%ss, concurrency=%s)",
+        "Worker started (poll_interval=%ss, concurrency=%s, lease=%ss)",
         POLL_INTERVAL,
         MAX_CONCURRENT_JOBS,
+        JOB_LEASE_SECONDS,
     )
 
+    last_reap = 0.0
     try:
         while True:
             await _sem.acquire()
             _sem.release()
 
             async with async_session() as session:
+                if time.monotonic() - last_reap >= REAP_INTERVAL:
+                    last_reap = time.monotonic()
+                    reaped = await _reap_expired(session)
+                    if reaped:
+                        logger.warning("Reclaimed %d jobs with expired leases", reaped)
                 job = await _dequeue(session)
 
             if job:
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import os
+import time
+
+from sqlalchemy import text
+
+from app.db import async_session
+from app.helpers.constants import (
+    ORPHAN_GC_BATCH_SIZE,
+    ORPHAN_GC_INTERVAL,
+    ORPHAN_GRACE_SECONDS,
+    REAPER_BATCH_SIZE,
+    REAPER_INTERVAL,
+    UPLOAD_DIR,
+)
+from app.helpers.files import deletions_pending
+from app.helpers.metrics import FILES_REMOVED
+
+logger = logging.getLogger("worker.reaper")
+
+
+def _remove(paths: list[str], modified_before: float | None = None) -> int:
+    removed = 0
+    for path in paths:
+        try:
+            # a thumb regenerated since it was picked is in use again
+            if (
+                modified_before is not None
+                and os.stat(path).st_mtime >= modified_before
+            ):
+                continue
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            # the row is gone either way, the orphan collector retries the file
+            logger.warning("[REAP] Could not remove %s: %s", path, e)
+    return removed
+
+
+async def reap_deleted() -> int:
+    """Remove the files queued by deletes, one short transaction per batch."""
+
+    removed = 0
+    while True:
+        async with async_session() as session:
+            result = await session.exec(
+                text("""
+                    DELETE FROM filedeletion
+                    WHERE id IN (
+                        SELECT id FROM filedeletion
+                        ORDER BY id
+                        LIMIT :batch
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING path
+                """).bindparams(batch=REAPER_BATCH_SIZE)
+            )
+            paths = [row[0] for row in result.all()]
+            # removed before the commit, a crash in between only repeats the batch
+            removed += await asyncio.to_thread(_remove, paths)
+            await session.commit()
+        if len(paths) < REAPER_BATCH_SIZE:
+            FILES_REMOVED.labels("deleted").inc(removed)
+            return removed
+
+
+def _candidates(directory: str, modified_before: float) -> list[str]:
+    try:
+        entries = os.scandir(directory)
+    except FileNotFoundError:
+        return []
+    with entries:
+        return [
+            os.path.join(directory, entry.name)
+            for entry in entries
+            if entry.is_file(follow_symlinks=False)
+            and entry.stat().st_mtime < modified_before
+        ]
+
+
+async def collect_orphans() -> int:
+    """
+    Remove files in UPLOAD_DIR and its thumbs/ that no image refers to, e.g. left
+    behind by a failed upload or a thumb written for an image deleted meanwhile.
+    Files younger than ORPHAN_GRACE_SECONDS are skipped. Returns the number of
+    files removed.
+    """
+
+    modified_before = time.time() - ORPHAN_GRACE_SECONDS
+    removed = 0
+    for directory in (UPLOAD_DIR, os.path.join(UPLOAD_DIR, "thumbs")):
+        candidates = await asyncio.to_thread(_candidates, directory, modified_before)
+        for start in range(0, len(candidates), ORPHAN_GC_BATCH_SIZE):
+            async with async_session() as session:
+                result = await session.exec(
+                    text("""
+                        SELECT p FROM unnest(CAST(:paths AS text[])) AS p
+                        WHERE NOT EXISTS (SELECT 1 FROM image WHERE path = p)
+                          AND NOT EXISTS (SELECT 1 FROM image WHERE thumb = p)
+                    """).bindparams(
+                        paths=candidates[start : start + ORPHAN_GC_BATCH_SIZE]
+                    )
+                )
+                orphans = [row[0] for row in result.all()]
+            removed += await asyncio.to_thread(_remove, orphans, modified_before)
+    FILES_REMOVED.labels("orphan").inc(removed)
+    return removed
+
+
+async def start_reaper() -> None:
+    """
+    Remove the files of deleted images as soon as deletes commit, and collect
+    orphaned files every ORPHAN_GC_INTERVAL. Runs until cancelled.
+    """
+
+    logger.info(
+        "Reaper started (interval=%ss, orphan_gc_interval=%ss, grace=%ss)",
+        REAPER_INTERVAL,
+        ORPHAN_GC_INTERVAL,
+        ORPHAN_GRACE_SECONDS,
+    )
+
+    last_gc = time.monotonic()
+    while True:
+        try:
+            try:
+                await asyncio.wait_for(deletions_pending.wait(), REAPER_INTERVAL)
+            except TimeoutError:
+                pass
+            # cleared first, deletes committing while this runs go another round
+            deletions_pending.clear()
+            removed = await reap_deleted()
+            if removed:
+                logger.info("[REAP] Removed %d files of deleted images", removed)
+
+            if time.monotonic() - last_gc >= ORPHAN_GC_INTERVAL:
+                last_gc = time.monotonic()
+                orphans = await collect_orphans()
+                if orphans:
+                    logger.info("[REAP] Removed %d orphaned files", orphans)
+
+        except asyncio.CancelledError:
+            logger.info("Reaper stopped")
+            raise
+
+        except Exception:
+            logger.exception("[REAP] Reap failed")
+            await asyncio.sleep(REAPER_INTERVAL)
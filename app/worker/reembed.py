@@ -0,0 +1,207 @@
+import asyncio
+import logging
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlmodel import func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.db import async_session
+from app.db.model import ACTIVE_JOBS, EmbeddingModel, Image, ImageEmbedding
+from app.helpers.cache import bump_generation
+from app.helpers.constants import (
+    REEMBED_BATCH_INTERVAL,
+    REEMBED_BATCH_SIZE,
+    REEMBED_POLL_INTERVAL,
+)
+from app.helpers.enums import EmbeddingModelStatus, JobPriority
+from app.worker.vector import generate_vectors, load_model, release_model
+
+logger = logging.getLogger("worker.reembed")
+
+
+async def _building_model(session: AsyncSession) -> str | None:
+    result = await session.exec(
+        select(EmbeddingModel.name).where(
+            EmbeddingModel.status == EmbeddingModelStatus.BUILDING
+        )
+    )
+    return result.first()
+
+
+async def _reembed_batch(session: AsyncSession, target: str) -> int:
+    """Stage embeddings from `target` for the next batch of uncovered images."""
+
+    result = await session.exec(
+        # lazy thumbnails may not exist yet, the original is read reduced instead
+        select(Image.id, func.coalesce(Image.thumb, Image.path))
+        .where(
+            Image.embeddings.is_not(None),  # type: ignore[union-attr]
+            ~select(ImageEmbedding.image_id)
+            .where(
+                ImageEmbedding.image_id == Image.id,
+                ImageEmbedding.model == target,
+            )
+            .exists(),
+        )
+        .order_by(Image.id)
+        .limit(REEMBED_BATCH_SIZE)
+    )
+    batch = result.all()
+    if not batch:
+        return 0
+
+    vectors = await asyncio.to_thread(
+        generate_vectors, [path for _, path in batch], target
+    )
+    for (image_id, path), vector in zip(batch, vectors):
+        if vector is None:
+            # staged empty so the batches move on. promotion leaves the image on
+            # the old model and queues a VECTOR job for it instead
+            logger.warning(
+                "[REEMBED] Could not embed %s with %s, skipping it", path, target
+            )
+        await session.merge(
+            ImageEmbedding(image_id=image_id, model=target, embeddings=vector)
+        )
+    await session.commit()
+    return len(batch)
+
+
+async def _promote(session: AsyncSession, target: str) -> None:
+    """
+    Swap the staged embeddings in as the live ones in a single transaction.
+    Neighbour lists and images left with an old-model vector belong to the old
+    embedding space, so they are rebuilt.
+    """
+
+    previous = (
+        await session.exec(
+            select(EmbeddingModel.name).where(
+                EmbeddingModel.status == EmbeddingModelStatus.ACTIVE
+            )
+        )
+    ).first()
+
+    await session.exec(
+        text("""
+            UPDATE image
+            SET embeddings = staged.embeddings,
+                embedding_model = staged.model,
+                neighbors_updated_at = NULL
+            FROM imageembedding staged
+            WHERE staged.image_id = image.id
+              AND staged.model = :target
+              AND staged.embeddings IS NOT NULL
+        """).bindparams(target=target)
+    )
+    await session.exec(text("DELETE FROM imageneighbor"))
+    # images embedded by the old model while the batches were running, or that
+    # the new one could not read
+    await session.exec(
+        text(f"""
+            INSERT INTO serviceq (
+                id, image_id, service_type, status, priority, uploaded_by,
+                created_at, updated_at
+            )
+            SELECT gen_random_uuid(), id, 'VECTOR', 'PENDING', :priority, uploaded_by,
+                NOW(), NOW()
+            FROM image
+            WHERE embeddings IS NOT NULL AND embedding_model IS DISTINCT FROM :target
+            ON CONFLICT (image_id, service_type) WHERE {ACTIVE_JOBS} DO NOTHING
+        """).bindparams(target=target, priority=JobPriority.BULK)
+    )
+    # their old-space vectors would be ranked against new-space queries, so they
+    # drop out of search until the VECTOR job above re-embeds them
+    await session.exec(
+        text("""
+            UPDATE image
+            SET embeddings = NULL, embedding_model = NULL
+            WHERE embeddings IS NOT NULL AND embedding_model IS DISTINCT FROM :target
+        """).bindparams(target=target)
+    )
+    await session.exec(
+        text(f"""
+            INSERT INTO serviceq (
+                id, image_id, service_type, status, priority, uploaded_by,
+                created_at, updated_at
+            )
+            SELECT gen_random_uuid(), id, 'NEIGHBORS', 'PENDING', :priority, uploaded_by,
+                NOW(), NOW()
+            FROM image
+            WHERE embeddings IS NOT NULL AND embedding_model = :target
+            ON CONFLICT (image_id, service_type) WHERE {ACTIVE_JOBS} DO NOTHING
+        """).bindparams(target=target, priority=JobPriority.BULK)
+    )
+    await session.exec(
+        text("""
+            UPDATE embeddingmodel
+            SET status = CASE WHEN name = :target
+                    THEN 'ACTIVE'::embeddingmodelstatus
+                    ELSE 'RETIRED'::embeddingmodelstatus
+                END,
+                updated_at = NOW()
+            WHERE name = :target OR status = 'ACTIVE'
+        """).bindparams(target=target)
+    )
+    await session.exec(
+        text("DELETE FROM imageembedding WHERE model = :target").bindparams(
+            target=target
+        )
+    )
+    await session.commit()
+    bump_generation()
+
+    if previous and previous != target:
+        release_model(previous)
+    logger.info("[REEMBED] Promoted %s (previously %s)", target, previous)
+
+
+async def _retire(session: AsyncSession, target: str) -> None:
+    model = await session.get(EmbeddingModel, target)
+    if model is not None:
+        model.status = EmbeddingModelStatus.RETIRED
+        model.updated_at = datetime.now()
+        session.add(model)
+        await session.commit()
+
+
+async def start_reembed() -> None:
+    """
+    Re-embed the library with a BUILDING model in throttled batches, then promote
+    it once every embedded image is covered. Runs until cancelled.
+    """
+
+    logger.info(
+        "Re-embedder started (batch_size=%s, batch_interval=%ss)",
+        REEMBED_BATCH_SIZE,
+        REEMBED_BATCH_INTERVAL,
+    )
+
+    while True:
+        try:
+            async with async_session() as session:
+                target = await _building_model(session)
+                if target is None:
+                    await asyncio.sleep(REEMBED_POLL_INTERVAL)
+                    continue
+
+                try:
+                    await asyncio.to_thread(load_model, target)
+                except Exception:
+                    logger.exception("[REEMBED] Cannot load %s, retiring it", target)
+                    await _retire(session, target)
+                    continue
+
+                if await _reembed_batch(session, target) == 0:
+                    await _promote(session, target)
+
+            await asyncio.sleep(REEMBED_BATCH_INTERVAL)
+
+        except asyncio.CancelledError:
+            logger.info("Re-embedder stopped")
+            raise
+
+        except Exception:
+            logger.exception("[REEMBED] Batch failed")
+            await asyncio.sleep(REEMBED_POLL_INTERVAL)
@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import os
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import text
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.db.model import EmbeddingModel, Image
+from app.helpers.cache import bump_generation
+from app.helpers.constants import CLIP_MODEL, LAZY_THUMBNAILS
+from app.helpers.embedding import active_model
+from app.helpers.enums import EmbeddingModelStatus, ServiceType
+from app.helpers.jobs import enqueue
+from app.worker.autotag import merge_tags, score_tags
+from app.worker.detect import detect_batcher
+from app.worker.neighbors import update_neighbors
+from app.worker.thumb import generate_thumb
+from app.worker.vector import generate_vector
+
+logger = logging.getLogger("worker.stages")
+
+# does the work of one job inside the job's transaction. returning False stops
+# the pipeline for the image, no successors are queued.
+StageHandler = Callable[[AsyncSession, Image, dict], Awaitable[bool]]
+
+
+@dataclass(frozen=True)
+class Stage:
+    service_type: ServiceType
+    handler: StageHandler
+    # stages that must have completed for the image before this one is queued
+    after: tuple[ServiceType, ...] = ()
+    # called once the job's transaction has committed
+    after_commit: Callable[[], None] | None = None
+
+
+_STAGES: dict[ServiceType, Stage] = {}
+
+
+def stage(
+    service_type: ServiceType,
+    after: tuple[ServiceType, ...] = (),
+    after_commit: Callable[[], None] | None = None,
+) -> Callable[[StageHandler], StageHandler]:
+    """
+    Register the handler of a pipeline stage. Prerequisites must be registered
+    first, which keeps the graph acyclic.
+    """
+
+    def register(handler: StageHandler) -> StageHandler:
+        missing = [dep for dep in after if dep not in _STAGES]
+        if missing:
+            raise ValueError(f"{service_type} depends on unregistered {missing}")
+        _STAGES[service_type] = Stage(service_type, handler, after, after_commit)
+        return handler
+
+    return register
+
+
+def get_stage(service_type: ServiceType) -> Stage | None:
+    return _STAGES.get(service_type)
+
+
+async def _completed(
+    session: AsyncSession, image_id, service_types: tuple[ServiceType, ...]
+) -> set[ServiceType]:
+    """Stages whose latest job for the image has completed."""
+
+    result = await session.exec(
+        text("""
+            SELECT service_type FROM (
+                SELECT DISTINCT ON (service_type) service_type, status
+                FROM serviceq
+                WHERE image_id = :image_id
+                  AND service_type = ANY(CAST(:service_types AS servicetype[]))
+                ORDER BY service_type, created_at DESC
+            ) latest
+            WHERE status = 'COMPLETED'
+        """).bindparams(
+            image_id=image_id, service_types=[s.value for s in service_types]
+        )
+    )
+    return {ServiceType(row[0]) for row in result.all()}
+
+
+async def enqueue_successors(session: AsyncSession, job: dict) -> list[ServiceType]:
+    """
+    Queue every stage that was waiting on the finished job and has no other
+    prerequisite left. Call after the job is marked completed, in the same
+    transaction. Returns the queued stages.
+    """
+
+    successors = [s for s in _STAGES.values() if job["service_type"] in s.after]
+    if any(len(s.after) > 1 for s in successors):
+        # fan-in: prerequisites finishing at the same time must not both see the
+        # other one as still running, so they take turns on the image row
+        await session.exec(
+            select(Image.id).where(Image.id == job["image_id"]).with_for_update()
+        )
+        done = await _completed(
+            session,
+            job["image_id"],
+            tuple({dep for s in successors for dep in s.after}),
+        )
+    else:
+        done = {job["service_type"]}
+
+    queued = []
+    for successor in successors:
+        if done.issuperset(successor.after):
+            await enqueue(
+                session,
+                job["image_id"],
+                successor.service_type,
+                job["priority"],
+                job["uploaded_by"],
+            )
+            queued.append(successor.service_type)
+    return queued
+
+
+@stage(ServiceType.THUMB)
+async def _thumb(session: AsyncSession, image: Image, job: dict) -> bool:
+    # lazy thumbs are made on first request, or one was requested before this ran
+    if LAZY_THUMBNAILS or image.thumb:
+        return True
+    thumb_path = await asyncio.to_thread(generate_thumb, image.path)
+    # if the image was deleted while the thumb was being generated, remove the file too.
+    exists_result = await session.exec(select(Image.id).where(Image.id == image.id))
+    if exists_result.first() is None:
+        try:
+            await asyncio.to_thread(os.remove, thumb_path)
+        except FileNotFoundError:
+            pass
+        return False
+    image.thumb = thumb_path
+    image.updated_at = datetime.now()
+    session.add(image)
+    return True
+
+
+@stage(ServiceType.VECTOR, after=(ServiceType.THUMB,), after_commit=bump_generation)
+async def _vector(session: AsyncSession, image: Image, job: dict) -> bool:
+    model_name = await active_model(session)
+    embeddings = await asyncio.to_thread(
+        generate_vector, image.thumb or image.path, model_name
+    )
+    # a promotion committing during inference would leave an old-space vector
+    # behind its re-enqueue. the share lock holds off the next one until commit
+    status = (
+        await session.exec(
+            select(EmbeddingModel.status)
+            .where(EmbeddingModel.name == model_name)
+            .with_for_update(read=True)
+        )
+    ).first()
+    if status is not None and status != EmbeddingModelStatus.ACTIVE:
+        # this process may not have seen the promotion, the retry re-reads it
+        bump_generation()
+        raise ValueError(
+            f"VECTOR: {model_name} was replaced while embedding image {image.id}"
+        )
+    image.embeddings = embeddings
+    image.embedding_model = model_name
+    image.updated_at = datetime.now()
+    session.add(image)
+    return True
+
+
+@stage(ServiceType.DETECTOR, after=(ServiceType.THUMB,))
+async def _detector(session: AsyncSession, image: Image, job: dict) -> bool:
+    labels = await detect_batcher.detect(image.thumb or image.path)
+    # the job may have waited on a batch, pick up tag edits made in the meantime
+    # and hold the row so AUTOTAG or a user edit cannot overwrite them until commit
+    await session.refresh(image, ["tags", "auto_tags"], with_for_update=True)
+    # tags set by users are kept, detected ones are added after them. a detected
+    # tag that auto-tagging also scored belongs to the detector from now on
+    image.tags = list(dict.fromkeys([*image.tags, *labels]))
+    image.auto_tags = [tag for tag in image.auto_tags if tag not in labels]
+    image.updated_at = datetime.now()
+    session.add(image)
+    return True
+
+
+@stage(ServiceType.NEIGHBORS, after=(ServiceType.VECTOR,))
+async def _neighbors(session: AsyncSession, image: Image, job: dict) -> bool:
+    if image.embeddings is None:
+        raise ValueError(f"NEIGHBORS: Image {image.id} has no embeddings yet")
+    await update_neighbors(session, image)
+    return True
+
+
+@stage(ServiceType.AUTOTAG, after=(ServiceType.VECTOR,))
+async def _autotag(session: AsyncSession, image: Image, job: dict) -> bool:
+    if image.embeddings is None:
+        raise ValueError(f"AUTOTAG: Image {image.id} has no embeddings yet")
+    embedding = np.asarray([image.embeddings.to_list()], dtype=np.float32)
+    model_name = image.embedding_model or CLIP_MODEL
+    auto = (await asyncio.to_thread(score_tags, embedding, model_name))[0]
+    # merged under the row lock, like DETECTOR, so neither drops the other's tags
+    await session.refresh(image, ["tags", "auto_tags"], with_for_update=True)
+    image.tags, image.auto_tags = merge_tags(image.tags, image.auto_tags, auto)
+    image.updated_at = datetime.now()
+    session.add(image)
+    return True
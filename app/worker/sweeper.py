@@ -0,0 +1,79 @@
+import asyncio
+import logging
+
+from sqlalchemy import text
+
+from app.db import async_session
+from app.helpers.constants import (
+    SERVICEQ_FAILED_RETENTION_DAYS,
+    SERVICEQ_RETENTION_DAYS,
+    SWEEP_BATCH_SIZE,
+    SWEEP_INTERVAL,
+)
+
+logger = logging.getLogger("worker.sweeper")
+
+
+async def _sweep(status: str, days: int) -> int:
+    """
+    Delete `status` rows older than `days`, one short transaction per batch.
+    The latest row of each stage of an image is kept, fan-in stages read their
+    prerequisites' state from it.
+    """
+
+    deleted = 0
+    while True:
+        async with async_session() as session:
+            result = await session.exec(
+                text("""
+                    DELETE FROM serviceq
+                    WHERE id IN (
+                        SELECT id FROM serviceq
+                        WHERE status = CAST(:status AS servicestatus)
+                          AND updated_at < NOW() - make_interval(days => :days)
+                          AND EXISTS (
+                              SELECT 1 FROM serviceq newer
+                              WHERE newer.image_id = serviceq.image_id
+                                AND newer.service_type = serviceq.service_type
+                                AND newer.created_at > serviceq.created_at
+                          )
+                        LIMIT :batch
+                        FOR UPDATE SKIP LOCKED
+                    )
+                """).bindparams(status=status, days=days, batch=SWEEP_BATCH_SIZE)
+            )
+            await session.commit()
+        deleted += result.rowcount
+        if result.rowcount < SWEEP_BATCH_SIZE:
+            return deleted
+        # let the workers in between batches
+        await asyncio.sleep(0)
+
+
+async def start_sweeper() -> None:
+    """Periodically delete finished serviceq rows past retention. Runs until cancelled."""
+
+    logger.info(
+        "Sweeper started (interval=%ss, retention=%sd, failed_retention=%sd)",
+        SWEEP_INTERVAL,
+        SERVICEQ_RETENTION_DAYS,
+        SERVICEQ_FAILED_RETENTION_DAYS,
+    )
+
+    while True:
+        try:
+            completed = await _sweep("COMPLETED", SERVICEQ_RETENTION_DAYS)
+            failed = await _sweep("FAILED", SERVICEQ_FAILED_RETENTION_DAYS)
+            if completed or failed:
+                logger.info(
+                    "[SWEEP] Deleted %d completed and %d failed jobs", completed, failed
+                )
+            await asyncio.sleep(SWEEP_INTERVAL)
+
+        except asyncio.CancelledError:
+            logger.info("Sweeper stopped")
+            raise
+
+        except Exception:
+            logger.exception("[SWEEP] Sweep failed")
+            await asyncio.sleep(SWEEP_INTERVAL)
@@ -1,12 +1,33 @@
+import asyncio
 import logging
 import os
+from uuid import UUID
 
 from PIL import Image
+from sqlalchemy import text
 
+from app.db import async_session
 from app.helpers.constants import THUMB_SIZE, UPLOAD_DIR
 
 logger = logging.getLogger("worker.thumb")
 
+# on-demand generations in flight, so concurrent requests for one image share it
+_inflight: dict[UUID, asyncio.Task] = {}
+
+
+def open_reduced(image_path: str, size: tuple[int, int] = THUMB_SIZE) -> Image.Image:
+    """
+    Decode an image scaled to fit within `size`, as RGB. JPEGs are decoded at
+    a reduced scale directly, which is several times cheaper than decoding the
+    full image and resizing it.
+    """
+
+    with Image.open(image_path) as img:
+        img.draft("RGB", size)
+        img = img.convert("RGB")
+    img.thumbnail(size)
+    return img
+
 
 def generate_thumb(image_path: str) -> str:
     """
@@ -18,8 +39,43 @@ def generate_thumb(image_path: str) -> str:
     thumb_path = os.path.join(thumb_dir, os.path.basename(image_path))
 
     with Image.open(image_path) as img:
+        img.draft(img.mode, THUMB_SIZE)
         img.thumbnail(THUMB_SIZE)
         img.save(thumb_path)
 
     logger.info("[THUMB] Saved thumbnail to %s", thumb_path)
     return thumb_path
+
+
+async def _generate_and_store(image_id: UUID, image_path: str) -> str:
+    thumb_path = await asyncio.to_thread(generate_thumb, image_path)
+    async with async_session() as session:
+        result = await session.exec(
+            text("""
+                UPDATE image SET thumb = :thumb, updated_at = NOW()
+                WHERE id = :id
+            """).bindparams(thumb=thumb_path, id=image_id)
+        )
+        await session.commit()
+    if result.rowcount == 0:
+        # deleted while the thumb was being generated
+        try:
+            await asyncio.to_thread(os.remove, thumb_path)
+        except FileNotFoundError:
+            pass
+    return thumb_path
+
+
+async def thumb_on_demand(image_id: UUID, image_path: str) -> str:
+    """
+    Generate and record the thumbnail of an image that has none yet. Requests
+    arriving while it is being generated wait for the same result.
+    """
+
+    task = _inflight.get(image_id)
+    if task is None:
+        task = asyncio.create_task(_generate_and_store(image_id, image_path))
+        _inflight[image_id] = task
+        task.add_done_callback(lambda _: _inflight.pop(image_id, None))
+    # shielded so a client hanging up does not abort it for everyone else
+    return await asyncio.shield(task)
@@ -1,46 +1,78 @@
 import logging
 import threading
+from typing import TYPE_CHECKING
 
-import torch
 from PIL import Image
-from transformers import CLIPModel, CLIPProcessor
 
-from app.helpers.constants import CLIP_MODEL, CPU_ONLY
+from app.helpers.constants import CLIP_MODEL, CPU_ONLY, EMBEDDING_DIM
+from app.helpers.metrics import INFERENCE_DURATION, INFERENCE_ITEMS
+from app.worker.thumb import open_reduced
+
+# torch and transformers take seconds to import, they are loaded with the first
+# model so the API can start serving before anything needs an embedding
+if TYPE_CHECKING:
+    from transformers import CLIPModel, CLIPProcessor
 
 logger = logging.getLogger("worker.vector")
 
 _lock = threading.Lock()
 _device: str | None = None
-_model: CLIPModel | None = None
-_processor: CLIPProcessor | None = None
+_models: dict[str, tuple["CLIPModel", "CLIPProcessor"]] = {}
+
 
+def load_model(
+    model_name: str = CLIP_MODEL,
+) -> tuple["CLIPModel", "CLIPProcessor", str]:
+    """Load a model once per process. Returns it with its processor and device."""
 
-def _load_model() -> tuple[CLIPModel, CLIPProcessor, str]:
-    global _device, _model, _processor
-    if _model is None:
+    global _device
+    if model_name not in _models:
         with _lock:
-            if _model is None:
+            if model_name not in _models:
+                import torch
+                from transformers import CLIPModel, CLIPProcessor
+
                 _device = (
                     "cpu"
                     if CPU_ONLY
                     else ("cuda" if torch.cuda.is_available() else "cpu")
                 )
-                logger.info("[VECTOR] Using device: %s", _device)
-                _model = CLIPModel.from_pretrained(CLIP_MODEL).to(_device)
-                _processor = CLIPProcessor.from_pretrained(CLIP_MODEL)
-                _model.eval()
-    return _model, _processor, _device
+                logger.info("[VECTOR] Loading %s on device: %s", model_name, _device)
+                model = CLIPModel.from_pretrained(model_name).to(_device)
+                processor = CLIPProcessor.from_pretrained(model_name)
+                model.eval()
+                if model.config.projection_dim != EMBEDDING_DIM:
+                    raise ValueError(
+                        f"{model_name} produces {model.config.projection_dim}-d "
+                        f"embeddings, expected {EMBEDDING_DIM}"
+                    )
+                _models[model_name] = (model, processor)
+    model, processor = _models[model_name]
+    return model, processor, _device
 
 
-def generate_text_vector(text: str) -> list[float]:
-    """Generate a CLIP embedding for a text query."""
+def release_model(model_name: str) -> None:
+    """Drop a loaded model, e.g. once a newer one has been promoted."""
+
+    with _lock:
+        if _models.pop(model_name, None) is not None:
+            logger.info("[VECTOR] Released %s", model_name)
 
-    model, processor, _ = _load_model()
 
-    inputs = processor(text=[text], return_tensors="pt", padding=True)
+def generate_text_vectors(
+    texts: list[str], model_name: str = CLIP_MODEL
+) -> list[list[float]]:
+    """Generate CLIP embeddings for several text queries in one forward pass."""
+
+    import torch
+
+    model, processor, _ = load_model(model_name)
+
+    inputs = processor(text=texts, return_tensors="pt", padding=True, truncation=True)
     inputs = {k: v.to(model.device) for k, v in inputs.items()}
 
-    with torch.no_grad():
+    INFERENCE_ITEMS.labels("text", model_name).inc(len(texts))
+    with INFERENCE_DURATION.labels("text", model_name).time(), torch.no_grad():
         text_outputs = model.text_model(
             input_ids=inputs["input_ids"],
             attention_mask=inputs["attention_mask"],
@@ -49,25 +81,61 @@ def generate_text_vector(text: str) -> list[float]:
         outputs = model.text_projection(pooled)
 
     embeddings = outputs / outputs.norm(dim=-1, keepdim=True)
-    return embeddings.cpu().numpy().squeeze(0).tolist()
+    return embeddings.cpu().numpy().tolist()
+
 
+def generate_text_vector(text: str, model_name: str = CLIP_MODEL) -> list[float]:
+    """Generate a CLIP embedding for a text query."""
 
-def generate_vector(image_path: str) -> list[float]:
-    """Generate a vector for the image."""
+    return generate_text_vectors([text], model_name)[0]
 
-    logger.info("[VECTOR] Processing image: %s", image_path)
 
-    model, processor, _ = _load_model()
+def _embed_images(images: list[Image.Image], model_name: str) -> list[list[float]]:
+    import torch
 
-    with Image.open(image_path) as img:
-        inputs = processor(images=img, return_tensors="pt", padding=True)
-        inputs = {k: v.to(model.device) for k, v in inputs.items()}
+    model, processor, _ = load_model(model_name)
 
-        with torch.no_grad():
-            vision_outputs = model.vision_model(pixel_values=inputs["pixel_values"])
-            pooled = vision_outputs.pooler_output
-            outputs = model.visual_projection(pooled)
+    inputs = processor(images=images, return_tensors="pt", padding=True)
+    inputs = {k: v.to(model.device) for k, v in inputs.items()}
 
-        embeddings = outputs / outputs.norm(dim=-1, keepdim=True)
+    INFERENCE_ITEMS.labels("image", model_name).inc(len(images))
+    with INFERENCE_DURATION.labels("image", model_name).time(), torch.no_grad():
+        vision_outputs = model.vision_model(pixel_values=inputs["pixel_values"])
+        pooled = vision_outputs.pooler_output
+        outputs = model.visual_projection(pooled)
+
+    embeddings = outputs / outputs.norm(dim=-1, keepdim=True)
+    return embeddings.cpu().numpy().tolist()
+
+
+def generate_vector(image_path: str, model_name: str = CLIP_MODEL) -> list[float]:
+    """Generate a vector for the image, a thumbnail or a reduced decode of it."""
+
+    logger.info("[VECTOR] Processing image: %s", image_path)
 
-        return embeddings.cpu().numpy().squeeze(0).tolist()
+    return _embed_images([open_reduced(image_path)], model_name)[0]
+
+
+def generate_vectors(
+    image_paths: list[str], model_name: str = CLIP_MODEL
+) -> list[list[float] | None]:
+    """
+    Generate vectors for a batch of images in one forward pass. Images that
+    cannot be read get None instead of failing the whole batch.
+    """
+
+    images: list[Image.Image] = []
+    loaded: list[int] = []
+    for i, path in enumerate(image_paths):
+        try:
+            images.append(open_reduced(path))
+            loaded.append(i)
+        except Exception as e:
+            logger.warning("[VECTOR] Skipping unreadable image %s: %s", path, e)
+
+    vectors: list[list[float] | None] = [None] * len(image_paths)
+    if images:
+        for i, vector in zip(loaded, _embed_images(images, model_name)):
+            vectors[i] = vector
+    logger.info("[VECTOR] Embedded %d/%d images", len(images), len(image_paths))
+    return vectors
@@ -0,0 +1,209 @@
+"""
+Load benchmark for the read endpoints against a synthetic library.
+
+    uv run python -m bench.api --images 20000 --requests 4000 --concurrency 32
+
+By default the app is driven in-process over ASGI with the text encoder replaced
+by a deterministic stub, so no model is downloaded and the numbers cover the API
+and database only. Pass --url to drive a running server instead (its text
+encoder is real then). Seeded rows belong to "bench" users and are replaced on
+every run, so point DATABASE_URL at a scratch database.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+from collections import defaultdict
+from functools import partial
+
+import httpx
+
+from app.helpers.constants import UPLOAD_DIR
+from app.helpers.deps import create_access_token
+from bench.common import latency_summary, write_result
+from bench.library import (
+    TAGS,
+    bench_admin,
+    cluster_centers,
+    library_ids,
+    seed_library,
+    stub_text_vector,
+)
+
+ENDPOINTS = ("list", "search", "similar", "thumb")
+
+_QUERIES = [
+    "a dog on the beach",
+    "city lights at night",
+    "snowy mountain",
+    "cat on a sofa",
+    "plate of food",
+    "forest trail",
+    "portrait of a woman",
+    "busy street",
+    "sunset over the sea",
+    "red car",
+]
+
+
+def _plan(args, ids: list, rng: random.Random) -> list[tuple[str, str, dict]]:
+    """Pre-drawn request sequence, so runs with the same seed are comparable."""
+
+    weights = [float(w) for w in args.mix.split(",")]
+    # distinct strings, so each one is its own search cache entry
+    queries = [
+        _QUERIES[i % len(_QUERIES)] + (f" {i}" if i >= len(_QUERIES) else "")
+        for i in range(args.queries)
+    ]
+    pages = max(1, min(args.images, 2000) // 20)
+
+    plan = []
+    for endpoint in rng.choices(ENDPOINTS, weights, k=args.requests + args.warmup):
+        match endpoint:
+            case "list":
+                params: dict = {"page": rng.randint(1, pages), "page_size": 20}
+                if rng.random() < 0.25:
+                    params["tag"] = rng.choice(TAGS)
+                plan.append((endpoint, "/images/list", params))
+            case "search":
+                plan.append(
+                    (endpoint, "/images/search", {"query": rng.choice(queries)})
+                )
+            case "similar":
+                plan.append((endpoint, f"/images/{rng.choice(ids)}/similar", {}))
+            case "thumb":
+                plan.append((endpoint, f"/images/{rng.choice(ids)}/thumb", {}))
+    return plan
+
+
+async def _drive(
+    client: httpx.AsyncClient, plan: list, concurrency: int, warmup: int
+) -> tuple[dict[str, list[float]], dict[str, dict[int, int]], float]:
+    latencies: dict[str, list[float]] = defaultdict(list)
+    statuses: dict[str, dict[int, int]] = defaultdict(lambda: defaultdict(int))
+    requests = iter(enumerate(plan))
+    measured_from = time.perf_counter()
+
+    async def worker() -> None:
+        nonlocal measured_from
+        for i, (endpoint, path, params) in requests:
+            if i == warmup:
+                measured_from = time.perf_counter()
+            start = time.perf_counter()
+            response = await client.get(path, params=params)
+            await response.aread()
+            if i >= warmup:
+                latencies[endpoint].append(time.perf_counter() - start)
+                statuses[endpoint][response.status_code] += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - measured_from
+
+
+def _client(args, admin_id) -> httpx.AsyncClient:
+    cookies = {"access_token": create_access_token(admin_id)}
+    limits = httpx.Limits(max_connections=args.concurrency)
+    if args.url:
+        return httpx.AsyncClient(
+            base_url=args.url, cookies=cookies, limits=limits, timeout=60
+        )
+
+    import app.routers.image as image_router
+    from app.main import app
+
+    centers = cluster_centers(args.seed, args.clusters)
+    stub = partial(stub_text_vector, centers)
+    image_router.generate_text_vector = lambda text, model_name=None: stub(text)
+    image_router.generate_text_vectors = lambda texts, model_name=None: [
+        stub(t) for t in texts
+    ]
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app),
+        base_url="http://bench",
+        cookies=cookies,
+        timeout=60,
+    )
+
+
+async def main(args) -> None:
+    if args.skip_seed:
+        admin_id = await bench_admin()
+        if admin_id is None:
+            raise SystemExit("No benchmark library found, run without --skip-seed")
+    else:
+        print(f"Seeding {args.images} images...")
+        start = time.perf_counter()
+        admin_id = await seed_library(
+            args.images, args.clusters, args.uploaders, args.seed, args.thumb_dir
+        )
+        print(f"Seeded in {time.perf_counter() - start:.1f}s")
+
+    rng = random.Random(args.seed)
+    ids = await library_ids(5000)
+    plan = _plan(args, ids, rng)
+
+    async with _client(args, admin_id) as client:
+        latencies, statuses, wall = await _drive(
+            client, plan, args.concurrency, args.warmup
+        )
+
+    total = sum(len(v) for v in latencies.values())
+    endpoints = {
+        endpoint: {
+            **latency_summary(latencies[endpoint]),
+            "rps": round(len(latencies[endpoint]) / wall, 1),
+            "statuses": dict(statuses[endpoint]),
+        }
+        for endpoint in ENDPOINTS
+        if endpoint in latencies
+    }
+    result = {
+        "config": {
+            k: v for k, v in vars(args).items() if k not in ("out", "thumb_dir")
+        },
+        "wall_seconds": round(wall, 2),
+        "throughput_rps": round(total / wall, 1),
+        "endpoints": endpoints,
+    }
+    path = write_result("api", result, args.out)
+
+    print(f"\n{total} requests in {wall:.1f}s, {total / wall:.1f} req/s")
+    print(f"{'endpoint':<10}{'count':>8}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for endpoint, stats in endpoints.items():
+        print(
+            f"{endpoint:<10}{stats['count']:>8}{stats['rps']:>9}"
+            f"{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}"
+            f"  {stats['statuses']}"
+        )
+    print(f"\nWrote {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--images", type=int, default=10000)
+    parser.add_argument("--clusters", type=int, default=50)
+    parser.add_argument("--uploaders", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-seed", action="store_true", help="reuse the library")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument(
+        "--queries",
+        type=int,
+        default=200,
+        help="distinct search queries, fewer means more search cache hits",
+    )
+    parser.add_argument(
+        "--mix",
+        default="40,30,20,10",
+        help="relative weights of list,search,similar,thumb requests",
+    )
+    parser.add_argument("--url", help="benchmark a running server instead")
+    parser.add_argument(
+        "--thumb-dir", default=os.path.join(UPLOAD_DIR, "thumbs", "bench")
+    )
+    parser.add_argument("--out", help="result file, defaults to bench/results/")
+    asyncio.run(main(parser.parse_args()))
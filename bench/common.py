@@ -0,0 +1,64 @@
+import json
+import os
+import subprocess
+from datetime import datetime
+
+import numpy as np
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def latency_summary(seconds: list[float]) -> dict:
+    """Count, mean and tail latencies in milliseconds."""
+
+    if not seconds:
+        return {"count": 0}
+    ms = np.asarray(seconds) * 1000
+    return {
+        "count": len(seconds),
+        "mean_ms": round(float(ms.mean()), 2),
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "max_ms": round(float(ms.max()), 2),
+    }
+
+
+def git_revision() -> str:
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        return f"{revision}-dirty" if dirty else revision
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def write_result(benchmark: str, result: dict, out: str | None = None) -> str:
+    """Write a run to `out`, or to results/<benchmark>-<time>-<commit>.json."""
+
+    revision = git_revision()
+    now = datetime.now()
+    payload = {
+        "benchmark": benchmark,
+        "commit": revision,
+        "timestamp": now.isoformat(timespec="seconds"),
+        **result,
+    }
+    if out is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out = os.path.join(
+            RESULTS_DIR, f"{benchmark}-{now:%Y%m%d-%H%M%S}-{revision}.json"
+        )
+    with open(out, "w") as f:
+        json.dump(payload, f, indent=2)
+    return out
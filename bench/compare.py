@@ -0,0 +1,52 @@
+"""
+Compare two benchmark result files.
+
+    uv run python -m bench.compare bench/results/api-A.json bench/results/api-B.json
+"""
+
+import argparse
+import json
+
+_METRICS = ("recall", "rps", "p50_ms", "p95_ms", "p99_ms")
+
+
+def _change(before: float, after: float) -> str:
+    if not before:
+        return ""
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def _sections(result: dict) -> dict[str, dict]:
+    # api runs report per endpoint, the others per stage or per setting
+    for key in ("endpoints", "stages", "settings"):
+        if key in result:
+            return result[key]
+    return {}
+
+
+def main(args) -> None:
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    print(f"{before['benchmark']}: {before['commit']} -> {after['commit']}")
+    if before.get("config") != after.get("config"):
+        print("warning: the runs used different configurations")
+
+    old, new = _sections(before), _sections(after)
+    for name in [*old, *(n for n in new if n not in old)]:
+        print(f"\n{name}")
+        for metric in _METRICS:
+            a = old.get(name, {}).get(metric)
+            b = new.get(name, {}).get(metric)
+            if a is None and b is None:
+                continue
+            print(f"  {metric:<8}{a!s:>10}{b!s:>10}  {_change(a or 0, b or 0)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    main(parser.parse_args())
@@ -0,0 +1,272 @@
+"""
+Recall vs latency benchmark for vector index settings.
+
+    uv run python -m bench.index --images 50000 --queries 200
+
+Computes exact top-k neighbours in numpy for a query set, then measures
+recall@k and latency of the database under each setting. Two kinds of query
+are used: "image" queries are library embeddings with the image itself
+excluded, as /images/{id}/similar issues them. "text" queries are library
+embeddings with heavy noise added, standing in for out-of-distribution text
+vectors. Swept settings:
+
+  exact    sequential scan, the ceiling for recall
+  bq       the production path: hamming HNSW over binary-quantized embeddings,
+           re-ranked on halfvec, swept over RERANK_CANDIDATES (= ef_search)
+  hnsw     HNSW on the halfvec embeddings, swept over hnsw.ef_search
+  ivfflat  IVFFlat on the halfvec embeddings, swept over ivfflat.probes
+
+The hnsw and ivfflat indexes are built for the run and dropped afterwards.
+--existing benchmarks the embeddings already in the database instead of
+seeding a synthetic library.
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import time
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import text
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import app.helpers.search as search
+from app.db import async_session
+from app.db.model import Image
+from app.helpers.constants import EMBEDDING_DIM, UPLOAD_DIR
+from bench.common import latency_summary, write_result
+from bench.library import seed_library
+
+_NIL = UUID(int=0)
+_BENCH_INDEX = "bench_ix_image_embeddings"
+
+
+def _ints(value: str) -> list[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+async def _load_embeddings(session: AsyncSession) -> tuple[list[UUID], np.ndarray]:
+    result = await session.exec(
+        select(Image.id, Image.embeddings).where(col(Image.embeddings).is_not(None))
+    )
+    rows = result.all()
+    ids = [row[0] for row in rows]
+    matrix = np.asarray([row[1].to_list() for row in rows], dtype=np.float32)
+    return ids, matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def _queries(
+    ids: list[UUID], matrix: np.ndarray, count: int, noise: float, seed: int
+) -> dict[str, list[tuple[np.ndarray, UUID]]]:
+    rng = np.random.default_rng(seed)
+    picked = rng.choice(len(ids), min(count, len(ids)), replace=False)
+    noisy = matrix[picked] + rng.normal(0, noise, (len(picked), EMBEDDING_DIM))
+    noisy /= np.linalg.norm(noisy, axis=1, keepdims=True)
+    return {
+        "image": [(matrix[i], ids[i]) for i in picked],
+        "text": [(vector, _NIL) for vector in noisy],
+    }
+
+
+def _ground_truth(
+    ids: list[UUID], matrix: np.ndarray, vector: np.ndarray, exclude: UUID, k: int
+) -> set[UUID]:
+    scores = matrix @ vector
+    # k + 1 leaves room for the excluded query image, kth must stay below len
+    top = np.argpartition(-scores, min(k + 1, len(scores) - 1))[: k + 1]
+    ranked = [ids[i] for i in top[np.argsort(-scores[top])] if ids[i] != exclude]
+    return set(ranked[:k])
+
+
+async def _bq(session: AsyncSession, vector: np.ndarray, exclude: UUID, k: int):
+    # the threshold is disabled so recall measures ranking, not the cut-off
+    ranked = await search.nearest_neighbors(
+        session, vector.tolist(), 2.0, exclude_ids=() if exclude == _NIL else (exclude,)
+    )
+    return [id_ for id_, _ in ranked[:k]]
+
+
+async def _plain(session: AsyncSession, vector: np.ndarray, exclude: UUID, k: int):
+    result = await session.exec(
+        text(f"""
+            SELECT id FROM image
+            WHERE embeddings IS NOT NULL AND id <> :exclude
+            ORDER BY embeddings <=> CAST(:query AS halfvec({EMBEDDING_DIM}))
+            LIMIT :k
+        """).bindparams(exclude=exclude, query=str(vector.tolist()), k=k)
+    )
+    return [row[0] for row in result.all()]
+
+
+async def _sweep(
+    label: str, setup: list[str], run, queries: dict, truth: dict, k: int
+) -> dict[str, dict]:
+    rows = {}
+    for kind, items in queries.items():
+        async with async_session() as session:
+            for statement in setup:
+                await session.exec(text(statement))
+            # one untimed pass per kind so every setting starts with a warm cache
+            for vector, exclude in items[:10]:
+                await run(session, vector, exclude, k)
+
+            latencies, recalls = [], []
+            start = time.perf_counter()
+            for (vector, exclude), expected in zip(items, truth[kind]):
+                query_start = time.perf_counter()
+                found = await run(session, vector, exclude, k)
+                latencies.append(time.perf_counter() - query_start)
+                recalls.append(len(expected.intersection(found)) / k)
+            wall = time.perf_counter() - start
+            await session.rollback()
+
+        row = {
+            "recall": round(float(np.mean(recalls)), 4),
+            "rps": round(len(items) / wall, 1),
+            **latency_summary(latencies),
+        }
+        rows[f"{label} {kind}"] = row
+        print(
+            f"{label:<28}{kind:<7}{row['recall']:>8.3f}"
+            f"{row['p50_ms']:>9}{row['p95_ms']:>9}"
+        )
+    return rows
+
+
+async def _build_index(using: str, options: str) -> float:
+    async with async_session() as session:
+        await session.exec(text("SET maintenance_work_mem = '512MB'"))
+        start = time.perf_counter()
+        await session.exec(
+            text(
+                f"CREATE INDEX {_BENCH_INDEX} ON image "
+                f"USING {using} (embeddings halfvec_cosine_ops) WITH ({options})"
+            )
+        )
+        await session.commit()
+        return time.perf_counter() - start
+
+
+async def _drop_index() -> None:
+    async with async_session() as session:
+        await session.exec(text(f"DROP INDEX IF EXISTS {_BENCH_INDEX}"))
+        await session.commit()
+
+
+async def main(args) -> None:
+    if not args.existing:
+        print(f"Seeding {args.images} images...")
+        await seed_library(
+            args.images, args.clusters, args.uploaders, args.seed, args.thumb_dir
+        )
+
+    async with async_session() as session:
+        ids, matrix = await _load_embeddings(session)
+    if len(ids) <= args.k:
+        raise SystemExit(f"Need more than {args.k} embedded images, found {len(ids)}")
+
+    queries = _queries(ids, matrix, args.queries, args.text_noise, args.seed)
+    truth = {
+        kind: [_ground_truth(ids, matrix, v, ex, args.k) for v, ex in items]
+        for kind, items in queries.items()
+    }
+    print(f"{len(ids)} embeddings, {args.queries} queries per kind, k={args.k}\n")
+    print(f"{'setting':<28}{'kind':<7}{'recall':>8}{'p50':>9}{'p95':>9}")
+
+    settings: dict[str, dict] = {}
+    builds: dict[str, float] = {}
+    kinds = args.index_types.split(",")
+
+    if "exact" in kinds:
+        settings |= await _sweep(
+            "exact",
+            ["SET LOCAL enable_indexscan = off"],
+            _plain,
+            queries,
+            truth,
+            args.k,
+        )
+
+    if "bq" in kinds:
+        default = search.RERANK_CANDIDATES
+        try:
+            for candidates in _ints(args.candidates):
+                search.RERANK_CANDIDATES = candidates
+                settings |= await _sweep(
+                    f"bq candidates={candidates}",
+                    [],
+                    _bq,
+                    queries,
+                    truth,
+                    args.k,
+                )
+        finally:
+            search.RERANK_CANDIDATES = default
+
+    try:
+        if "hnsw" in kinds:
+            builds["hnsw"] = await _build_index(
+                "hnsw", f"m = {args.m}, ef_construction = {args.ef_construction}"
+            )
+            for ef in _ints(args.ef_search):
+                settings |= await _sweep(
+                    f"hnsw ef_search={ef}",
+                    [f"SET LOCAL hnsw.ef_search = {ef}"],
+                    _plain,
+                    queries,
+                    truth,
+                    args.k,
+                )
+            await _drop_index()
+
+        if "ivfflat" in kinds:
+            lists = args.lists or max(1, int(math.sqrt(len(ids))))
+            builds["ivfflat"] = await _build_index("ivfflat", f"lists = {lists}")
+            for probes in _ints(args.probes):
+                settings |= await _sweep(
+                    f"ivfflat probes={probes}",
+                    [f"SET LOCAL ivfflat.probes = {probes}"],
+                    _plain,
+                    queries,
+                    truth,
+                    args.k,
+                )
+    finally:
+        await _drop_index()
+
+    result = {
+        "config": {
+            k: v for k, v in vars(args).items() if k not in ("out", "thumb_dir")
+        },
+        "embeddings": len(ids),
+        "index_build_seconds": {k: round(v, 2) for k, v in builds.items()},
+        "settings": settings,
+    }
+    print(f"\nWrote {write_result('index', result, args.out)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--existing", action="store_true", help="use current data")
+    parser.add_argument("--images", type=int, default=20000)
+    parser.add_argument("--clusters", type=int, default=50)
+    parser.add_argument("--uploaders", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--text-noise", type=float, default=0.08)
+    parser.add_argument("--index-types", default="exact,bq,hnsw,ivfflat")
+    parser.add_argument("--candidates", default="50,100,200,500,1000")
+    parser.add_argument("--ef-search", default="40,100,200,400")
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=64)
+    parser.add_argument("--probes", default="1,4,10,20,40")
+    parser.add_argument("--lists", type=int, help="ivfflat lists, default sqrt(n)")
+    parser.add_argument(
+        "--thumb-dir", default=os.path.join(UPLOAD_DIR, "thumbs", "bench")
+    )
+    parser.add_argument("--out", help="result file, defaults to bench/results/")
+    asyncio.run(main(parser.parse_args()))
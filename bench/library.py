@@ -0,0 +1,169 @@
+import os
+import zlib
+from uuid import UUID
+
+import numpy as np
+from PIL import Image as PILImage
+from sqlalchemy import delete, insert, text
+from sqlmodel import col, select
+
+from app.db import async_session
+from app.db.model import Image, User, uuid7
+from app.helpers.constants import EMBEDDING_DIM
+from app.helpers.embedding import active_model
+from app.helpers.enums import UserRole
+
+# every benchmark user carries this provider, which is how seeded rows are found
+BENCH_PROVIDER = "bench"
+
+TAGS = [
+    "beach",
+    "city",
+    "dog",
+    "cat",
+    "food",
+    "forest",
+    "mountain",
+    "night",
+    "portrait",
+    "snow",
+    "street",
+    "sunset",
+]
+
+_INSERT_BATCH = 1000
+_THUMB_FILES = 16
+
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def cluster_centers(seed: int, clusters: int) -> np.ndarray:
+    """
+    Centres the synthetic embeddings are scattered around. Uniformly random
+    vectors are all roughly orthogonal, so without clusters no search would
+    clear the similarity thresholds.
+    """
+
+    rng = np.random.default_rng(seed)
+    return _unit(rng.standard_normal((clusters, EMBEDDING_DIM)))
+
+
+def stub_text_vector(centers: np.ndarray, query: str) -> list[float]:
+    """Deterministic stand-in for the text encoder: a point near one cluster."""
+
+    key = zlib.crc32(query.encode())
+    rng = np.random.default_rng(key)
+    vector = centers[key % len(centers)] + rng.normal(0, 0.02, EMBEDDING_DIM)
+    return _unit(vector).tolist()
+
+
+def _write_thumbs(thumb_dir: str, seed: int) -> list[str]:
+    os.makedirs(thumb_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    paths = []
+    for i in range(_THUMB_FILES):
+        path = os.path.join(thumb_dir, f"bench-{i}.jpg")
+        pixels = rng.integers(0, 256, (256, 256, 3), dtype=np.uint8)
+        PILImage.fromarray(pixels).save(path, "JPEG", quality=85)
+        paths.append(path)
+    return paths
+
+
+async def clear_library() -> None:
+    """Remove everything a previous seed created."""
+
+    async with async_session() as session:
+        bench_users = select(User.id).where(User.provider == BENCH_PROVIDER)
+        await session.exec(delete(Image).where(col(Image.uploaded_by).in_(bench_users)))
+        await session.exec(delete(User).where(col(User.provider) == BENCH_PROVIDER))
+        await session.commit()
+
+
+async def seed_library(
+    images: int,
+    clusters: int,
+    uploaders: int,
+    seed: int,
+    thumb_dir: str,
+) -> UUID:
+    """
+    Replace the benchmark library with `images` rows spread over `uploaders`
+    users, with clustered normalized embeddings, a few tags each and small
+    JPEG thumbnails on disk. Returns the id of the benchmark admin user.
+    """
+
+    await clear_library()
+    rng = np.random.default_rng(seed)
+    centers = cluster_centers(seed, clusters)
+    thumbs = _write_thumbs(thumb_dir, seed)
+
+    async with async_session() as session:
+        admin = User(provider=BENCH_PROVIDER, provider_id="admin", role=UserRole.ADMIN)
+        users = [
+            User(
+                provider=BENCH_PROVIDER,
+                provider_id=f"uploader-{i}",
+                role=UserRole.WRITE,
+            )
+            for i in range(uploaders)
+        ]
+        session.add_all([admin, *users])
+        await session.commit()
+        model_name = await active_model(session)
+
+        for start in range(0, images, _INSERT_BATCH):
+            count = min(_INSERT_BATCH, images - start)
+            assigned = rng.integers(0, clusters, count)
+            vectors = _unit(
+                centers[assigned] + rng.normal(0, 0.05, (count, EMBEDDING_DIM))
+            )
+            rows = []
+            for i in range(count):
+                thumb = thumbs[rng.integers(0, len(thumbs))]
+                rows.append(
+                    {
+                        "id": uuid7(),
+                        "name": f"bench-{start + i}.jpg",
+                        "path": thumb,
+                        "thumb": thumb,
+                        "tags": list(
+                            rng.choice(TAGS, rng.integers(1, 4), replace=False)
+                        ),
+                        "embeddings": vectors[i].tolist(),
+                        "embedding_model": model_name,
+                        "hash": f"bench-{uuid7().hex}",
+                        "uploaded_by": users[rng.integers(0, len(users))].id,
+                    }
+                )
+            await session.exec(insert(Image).values(rows))
+            await session.commit()
+
+        await session.exec(text("ANALYZE image"))
+        await session.commit()
+        return admin.id
+
+
+async def library_ids(limit: int) -> list[UUID]:
+    """A random sample of the seeded image ids."""
+
+    async with async_session() as session:
+        bench_users = select(User.id).where(User.provider == BENCH_PROVIDER)
+        result = await session.exec(
+            select(Image.id)
+            .where(col(Image.uploaded_by).in_(bench_users))
+            .order_by(text("random()"))
+            .limit(limit)
+        )
+        return list(result.all())
+
+
+async def bench_admin() -> UUID | None:
+    async with async_session() as session:
+        result = await session.exec(
+            select(User.id).where(
+                User.provider == BENCH_PROVIDER, User.provider_id == "admin"
+            )
+        )
+        return result.first()
@@ -0,0 +1,137 @@
+"""
+Startup benchmark: how soon a freshly started API process answers.
+
+    uv run python -m bench.startup --runs 5
+
+Imports app.main in a clean interpreter to time it and to check that none of
+the model libraries (torch, transformers, torchvision) comes with it, then
+starts uvicorn repeatedly and times how long `/` and `/images/list` take to
+answer. /images/list is only measured when a benchmark library exists, see
+bench.api. Exits non-zero when the import or the first answer from `/` exceeds
+its budget or a model library was imported, so it can gate a deploy.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+
+import httpx
+
+from app.helpers.deps import create_access_token
+from bench.common import write_result
+from bench.library import bench_admin
+
+_MODEL_LIBRARIES = ("torch", "transformers", "torchvision")
+
+_IMPORT = f"""
+import json, sys, time
+start = time.perf_counter()
+import app.main
+print(json.dumps({{
+    "seconds": time.perf_counter() - start,
+    "loaded": [m for m in {_MODEL_LIBRARIES!r} if m in sys.modules],
+}}))
+"""
+
+
+async def _time_import() -> dict:
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-c", _IMPORT, stdout=asyncio.subprocess.PIPE
+    )
+    stdout, _ = await process.communicate()
+    if process.returncode != 0:
+        raise SystemExit("Importing app.main failed")
+    return json.loads(stdout.decode().strip().splitlines()[-1])
+
+
+async def _wait_for(client: httpx.AsyncClient, path: str, started: float) -> float:
+    while True:
+        try:
+            response = await client.get(path)
+            if response.status_code == 200:
+                return time.perf_counter() - started
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.01)
+
+
+async def _time_serve(port: int, admin_id, timeout: float) -> dict[str, float]:
+    started = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "app.main:app",
+        "--port",
+        str(port),
+        "--log-level",
+        "warning",
+    )
+    cookies = {"access_token": create_access_token(admin_id)} if admin_id else {}
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}", cookies=cookies, timeout=timeout
+        ) as client:
+            ready = {
+                "/": await asyncio.wait_for(_wait_for(client, "/", started), timeout)
+            }
+            if admin_id:
+                ready["/images/list"] = await asyncio.wait_for(
+                    _wait_for(client, "/images/list", started), timeout
+                )
+            return ready
+    finally:
+        process.terminate()
+        await process.wait()
+
+
+async def main(args) -> None:
+    imports = [await _time_import() for _ in range(args.runs)]
+    import_seconds = statistics.median(run["seconds"] for run in imports)
+    loaded = sorted({m for run in imports for m in run["loaded"]})
+
+    admin_id = await bench_admin()
+    serves = [
+        await _time_serve(args.port, admin_id, args.timeout) for _ in range(args.runs)
+    ]
+    ready = {
+        path: round(statistics.median(run[path] for run in serves), 3)
+        for path in serves[0]
+    }
+
+    result = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("out",)},
+        "import_seconds": round(import_seconds, 3),
+        "model_libraries_imported": loaded,
+        "ready_seconds": ready,
+    }
+    path = write_result("startup", result, args.out)
+
+    print(f"import app.main  {import_seconds:.3f}s (budget {args.import_budget}s)")
+    for route, seconds in ready.items():
+        print(f"first {route:<14}{seconds:.3f}s after spawn")
+    print(f"\nWrote {path}")
+
+    failures = []
+    if loaded:
+        failures.append(f"app.main imports {', '.join(loaded)}")
+    if import_seconds > args.import_budget:
+        failures.append(f"import took {import_seconds:.3f}s")
+    if ready["/"] > args.ready_budget:
+        failures.append(f"/ answered after {ready['/']:.3f}s")
+    if failures:
+        raise SystemExit("Over budget: " + "; ".join(failures))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--import-budget", type=float, default=1.5, help="seconds")
+    parser.add_argument("--ready-budget", type=float, default=3.0, help="seconds")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--out", help="result file, defaults to bench/results/")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,293 @@
+"""
+Throughput benchmark for the worker pipeline: THUMB, then VECTOR and DETECTOR,
+then NEIGHBORS and AUTOTAG.
+
+    uv run python -m bench.worker --images 200 --concurrency 4
+
+Writes synthetic images of varied sizes and formats, enqueues them through
+serviceq the way an upload does, runs start_worker until the queue drains and
+reports per-stage job latency, end-to-end throughput, CPU utilization and peak
+RSS. --stub-models replaces every model forward pass with random output, the
+CLIP image embedding, the CLIP text embedding of the auto-tag vocabulary and
+object detection, to isolate the rest of the pipeline. --detect-batch-size and
+--detect-batch-wait rebuild the detector batcher, --detect-batch-size 1 turns
+batching off. Any other pending jobs in the database are processed too, so use
+a scratch database.
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import time
+from collections import defaultdict
+
+import numpy as np
+from PIL import Image as PILImage
+from sqlalchemy import delete, text
+from sqlmodel import col, func, select
+
+import app.worker.autotag as autotag
+import app.worker.queue as queue
+import app.worker.stages as stages
+from app.db import async_session
+from app.db.model import Image, ServiceQ, User
+from app.helpers.constants import (
+    AUTOTAG_VOCABULARY,
+    DETECTOR_BATCH_SIZE,
+    DETECTOR_BATCH_WAIT,
+    EMBEDDING_DIM,
+    UPLOAD_DIR,
+)
+from app.helpers.enums import ServiceType, UserRole
+from app.worker.detect import DetectBatcher
+from bench.common import latency_summary, write_result
+from bench.library import BENCH_PROVIDER
+
+_SIZES = [(640, 480), (1280, 960), (1920, 1080), (3000, 2000), (4032, 3024)]
+_FORMATS = [("JPEG", ".jpg"), ("PNG", ".png"), ("WEBP", ".webp")]
+
+
+def _write_images(count: int, source_dir: str, seed: int) -> list[str]:
+    os.makedirs(source_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    paths = []
+    for i in range(count):
+        width, height = _SIZES[i % len(_SIZES)]
+        image_format, ext = _FORMATS[i % len(_FORMATS)]
+        # a smooth gradient plus noise compresses like a photo, unlike pure noise
+        x = np.linspace(0, 255, width, dtype=np.float32)
+        y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+        base = rng.integers(0, 256, 3)
+        pixels = np.stack(
+            [(x + y * c / 255 + b) % 256 for c, b in zip(rng.random(3) * 255, base)],
+            axis=-1,
+        ) + rng.normal(0, 8, (height, width, 3))
+        path = os.path.join(source_dir, f"bench-worker-{seed}-{i}{ext}")
+        PILImage.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(
+            path, image_format
+        )
+        paths.append(path)
+    return paths
+
+
+def _worker_users():
+    return select(User.id).where(
+        User.provider == BENCH_PROVIDER, User.provider_id == "worker"
+    )
+
+
+async def _clear() -> None:
+    async with async_session() as session:
+        users = _worker_users()
+        await session.exec(delete(Image).where(col(Image.uploaded_by).in_(users)))
+        await session.exec(
+            delete(User).where(
+                col(User.provider) == BENCH_PROVIDER, col(User.provider_id) == "worker"
+            )
+        )
+        await session.commit()
+
+
+async def _enqueue(paths: list[str]) -> None:
+    async with async_session() as session:
+        user = User(provider=BENCH_PROVIDER, provider_id="worker", role=UserRole.WRITE)
+        session.add(user)
+        await session.flush()
+        for path in paths:
+            image = Image(
+                name=os.path.basename(path),
+                path=path,
+                uploaded_by=user.id,
+                hash=f"bench-{os.path.basename(path)}",
+            )
+            session.add(image)
+            await session.flush()
+            session.add(
+                ServiceQ(
+                    image_id=image.id,
+                    service_type=ServiceType.THUMB,
+                    uploaded_by=user.id,
+                )
+            )
+        await session.commit()
+
+
+async def _outstanding() -> tuple[int, int]:
+    """Jobs still queued or running, and jobs that failed for good."""
+
+    async with async_session() as session:
+        result = await session.exec(
+            text("""
+                SELECT
+                    count(*) FILTER (WHERE status IN ('PENDING', 'RUNNING')),
+                    count(*) FILTER (WHERE status = 'FAILED')
+                FROM serviceq
+            """)
+        )
+        pending, failed = result.one()
+        return pending, failed
+
+
+async def _embedded() -> int:
+    async with async_session() as session:
+        result = await session.exec(
+            select(func.count())
+            .select_from(Image)
+            .where(
+                col(Image.embeddings).is_not(None),
+                col(Image.uploaded_by).in_(_worker_users()),
+            )
+        )
+        return result.one()
+
+
+def _configure(args) -> dict[str, list[float]]:
+    """Apply the worker settings under test and hook per-stage timing."""
+
+    queue._sem = asyncio.Semaphore(args.concurrency)
+    queue.POLL_INTERVAL = args.poll_interval
+    stages.detect_batcher = DetectBatcher(
+        args.detect_batch_size, args.detect_batch_wait
+    )
+
+    if args.torch_threads:
+        import torch
+
+        torch.set_num_threads(args.torch_threads)
+
+    if args.stub_models:
+        rng = np.random.default_rng(args.seed)
+
+        def stub_vector(image_path: str, model_name: str | None = None) -> list[float]:
+            with PILImage.open(image_path) as img:
+                img.load()
+            vector = rng.standard_normal(EMBEDDING_DIM)
+            return (vector / np.linalg.norm(vector)).tolist()
+
+        def stub_vocabulary(model_name: str) -> np.ndarray:
+            matrix = rng.standard_normal((len(AUTOTAG_VOCABULARY), EMBEDDING_DIM))
+            return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+        async def stub_detect(image_path: str) -> list[str]:
+            return []
+
+        stages.generate_vector = stub_vector
+        autotag._vocabulary = stub_vocabulary
+        stages.detect_batcher.detect = stub_detect
+
+    durations: dict[str, list[float]] = defaultdict(list)
+    observe = queue._observe_job
+
+    def timed_observe(job: dict, started: float, outcome: str) -> None:
+        durations[f"{job['service_type']}:{outcome}"].append(
+            time.perf_counter() - started
+        )
+        observe(job, started, outcome)
+
+    queue._observe_job = timed_observe
+    return durations
+
+
+async def main(args) -> None:
+    source_dir = os.path.join(args.upload_dir, "bench-worker")
+    await _clear()
+    print(f"Writing {args.images} synthetic images...")
+    paths = _write_images(args.images, source_dir, args.seed)
+    source_bytes = sum(os.path.getsize(p) for p in paths)
+
+    durations = _configure(args)
+    await _enqueue(paths)
+
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    worker = asyncio.create_task(queue.start_worker())
+    try:
+        while True:
+            await asyncio.sleep(0.5)
+            pending, failed = await _outstanding()
+            if pending == 0:
+                break
+            if args.timeout and time.perf_counter() - start > args.timeout:
+                print(f"Timed out with {pending} jobs outstanding")
+                break
+    finally:
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
+
+    wall = time.perf_counter() - start
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = (usage.ru_utime - usage_before.ru_utime) + (
+        usage.ru_stime - usage_before.ru_stime
+    )
+    embedded = await _embedded()
+
+    stage_latency = {
+        name: latency_summary(samples) for name, samples in durations.items()
+    }
+    result = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("out",)},
+        "source_mb": round(source_bytes / 2**20, 1),
+        "wall_seconds": round(wall, 2),
+        "embedded": embedded,
+        "failed_jobs": failed,
+        "images_per_second": round(embedded / wall, 2),
+        "cpu_seconds": round(cpu, 2),
+        "cpu_utilization": round(cpu / wall, 2),
+        "cpu_count": os.cpu_count(),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),
+        "stages": stage_latency,
+    }
+    path = write_result("worker", result, args.out)
+
+    print(
+        f"\n{embedded}/{args.images} images embedded in {wall:.1f}s, "
+        f"{embedded / wall:.2f} images/s"
+    )
+    print(
+        f"CPU {cpu:.1f}s ({cpu / wall:.2f} of {os.cpu_count()} cores), "
+        f"peak RSS {result['peak_rss_mb']} MB"
+    )
+    print(f"{'stage':<22}{'count':>7}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for name, stats in sorted(stage_latency.items()):
+        print(
+            f"{name:<22}{stats['count']:>7}{stats['p50_ms']:>9}"
+            f"{stats['p95_ms']:>9}{stats['p99_ms']:>9}"
+        )
+    print(f"\nWrote {path}")
+
+    if not args.keep:
+        await _clear()
+        thumb_dir = os.path.join(UPLOAD_DIR, "thumbs")
+        for source in paths:
+            for file in (source, os.path.join(thumb_dir, os.path.basename(source))):
+                try:
+                    os.remove(file)
+                except FileNotFoundError:
+                    pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--images", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=queue.MAX_CONCURRENT_JOBS)
+    parser.add_argument("--poll-interval", type=float, default=0.1)
+    parser.add_argument("--torch-threads", type=int, help="torch.set_num_threads")
+    parser.add_argument("--detect-batch-size", type=int, default=DETECTOR_BATCH_SIZE)
+    parser.add_argument(
+        "--detect-batch-wait", type=float, default=DETECTOR_BATCH_WAIT, help="seconds"
+    )
+    parser.add_argument(
+        "--stub-models",
+        "--stub-vector",
+        dest="stub_models",
+        action="store_true",
+        help="skip the CLIP and detector forward passes",
+    )
+    parser.add_argument("--timeout", type=float, default=0, help="seconds, 0 for none")
+    parser.add_argument("--upload-dir", default=UPLOAD_DIR)
+    parser.add_argument("--keep", action="store_true", help="keep images and rows")
+    parser.add_argument("--out", help="result file, defaults to bench/results/")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,66 @@
+"""add serviceq priority
+
+Revision ID: 089010a8961a
+Revises: 64b2cc29bd96
+Create Date: 2026-10-19 19:32:41.508127
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "089010a8961a"
+down_revision: Union[str, Sequence[str], None] = "64b2cc29bd96"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "serviceq",
+        sa.Column("priority", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column("serviceq", sa.Column("uploaded_by", sa.Uuid(), nullable=True))
+    op.execute(
+        """
+        UPDATE serviceq
+        SET uploaded_by = image.uploaded_by
+        FROM image
+        WHERE image.id = serviceq.image_id
+          AND serviceq.status IN ('PENDING', 'RUNNING')
+        """
+    )
+    op.drop_index(
+        "ix_serviceq_pending",
+        table_name="serviceq",
+        postgresql_where=sa.text("status = 'PENDING'"),
+    )
+    op.create_index(
+        "ix_serviceq_pending",
+        "serviceq",
+        ["priority", "uploaded_by", "run_after"],
+        unique=False,
+        postgresql_where=sa.text("status = 'PENDING'"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        "ix_serviceq_pending",
+        table_name="serviceq",
+        postgresql_where=sa.text("status = 'PENDING'"),
+    )
+    op.create_index(
+        "ix_serviceq_pending",
+        "serviceq",
+        ["run_after"],
+        unique=False,
+        postgresql_where=sa.text("status = 'PENDING'"),
+    )
+    op.drop_column("serviceq", "uploaded_by")
+    op.drop_column("serviceq", "priority")
@@ -0,0 +1,42 @@
+"""add autotag stage
+
+Revision ID: 0c7ee953294b
+Revises: aca095328274
+Create Date: 2026-10-19 21:40:17.602815
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0c7ee953294b"
+down_revision: Union[str, Sequence[str], None] = "aca095328274"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE servicetype ADD VALUE IF NOT EXISTS 'AUTOTAG'")
+
+    # images embedded before this are tagged in bulk by scripts/retag_library.py
+    op.add_column(
+        "image",
+        sa.Column(
+            "auto_tags",
+            sa.ARRAY(sa.String()),
+            nullable=False,
+            server_default="{}",
+        ),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # postgres cannot drop enum values, 'AUTOTAG' stays on servicetype
+    op.execute("DELETE FROM serviceq WHERE service_type = 'AUTOTAG'")
+    op.drop_column("image", "auto_tags")
@@ -0,0 +1,38 @@
+"""serviceq pending index
+
+Revision ID: 1a4a458b329a
+Revises: ce257e528223
+Create Date: 2026-10-19 17:52:10.418223
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "1a4a458b329a"
+down_revision: Union[str, Sequence[str], None] = "ce257e528223"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_serviceq_pending",
+        "serviceq",
+        ["created_at"],
+        unique=False,
+        postgresql_where=sa.text("status = 'PENDING'"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        "ix_serviceq_pending",
+        table_name="serviceq",
+        postgresql_where=sa.text("status = 'PENDING'"),
+    )
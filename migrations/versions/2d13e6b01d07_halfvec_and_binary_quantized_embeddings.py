@@ -0,0 +1,67 @@
+"""halfvec and binary quantized embeddings
+
+Revision ID: 2d13e6b01d07
+Revises: 874209ab88a2
+Create Date: 2026-10-19 10:12:31.418263
+
+"""
+
+from typing import Sequence, Union
+
+import pgvector.sqlalchemy
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "2d13e6b01d07"
+down_revision: Union[str, Sequence[str], None] = "874209ab88a2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.alter_column(
+        "image",
+        "embeddings",
+        existing_type=pgvector.sqlalchemy.vector.VECTOR(dim=512),
+        type_=pgvector.sqlalchemy.halfvec.HALFVEC(dim=512),
+        existing_nullable=True,
+        postgresql_using="embeddings::halfvec(512)",
+    )
+    op.add_column(
+        "image",
+        sa.Column(
+            "embeddings_bin",
+            pgvector.sqlalchemy.bit.BIT(length=512),
+            sa.Computed("binary_quantize(embeddings)::bit(512)", persisted=True),
+            nullable=True,
+        ),
+    )
+    op.create_index(
+        "ix_image_embeddings_bin",
+        "image",
+        ["embeddings_bin"],
+        unique=False,
+        postgresql_using="hnsw",
+        postgresql_ops={"embeddings_bin": "bit_hamming_ops"},
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        "ix_image_embeddings_bin",
+        table_name="image",
+        postgresql_using="hnsw",
+        postgresql_ops={"embeddings_bin": "bit_hamming_ops"},
+    )
+    op.drop_column("image", "embeddings_bin")
+    op.alter_column(
+        "image",
+        "embeddings",
+        existing_type=pgvector.sqlalchemy.halfvec.HALFVEC(dim=512),
+        type_=pgvector.sqlalchemy.vector.VECTOR(dim=512),
+        existing_nullable=True,
+        postgresql_using="embeddings::vector(512)",
+    )
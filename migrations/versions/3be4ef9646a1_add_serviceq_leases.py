@@ -0,0 +1,42 @@
+"""add serviceq leases
+
+Revision ID: 3be4ef9646a1
+Revises: 1a4a458b329a
+Create Date: 2026-10-19 18:20:41.602917
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3be4ef9646a1"
+down_revision: Union[str, Sequence[str], None] = "1a4a458b329a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("serviceq", sa.Column("locked_until", sa.DateTime(), nullable=True))
+    op.create_index(
+        "ix_serviceq_lease",
+        "serviceq",
+        ["locked_until"],
+        unique=False,
+        postgresql_where=sa.text("status = 'RUNNING'"),
+    )
+    # jobs left RUNNING by a previous process have no lease, let the reaper have them
+    op.execute("UPDATE serviceq SET locked_until = NOW() WHERE status = 'RUNNING'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        "ix_serviceq_lease",
+        table_name="serviceq",
+        postgresql_where=sa.text("status = 'RUNNING'"),
+    )
+    op.drop_column("serviceq", "locked_until")
@@ -0,0 +1,60 @@
+"""add image neighbors
+
+Revision ID: 45bd6a4a44a7
+Revises: 2d13e6b01d07
+Create Date: 2026-10-19 11:03:54.902117
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "45bd6a4a44a7"
+down_revision: Union[str, Sequence[str], None] = "2d13e6b01d07"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE servicetype ADD VALUE IF NOT EXISTS 'NEIGHBORS'")
+
+    op.create_table(
+        "imageneighbor",
+        sa.Column("image_id", sa.Uuid(), nullable=False),
+        sa.Column("neighbor_id", sa.Uuid(), nullable=False),
+        sa.Column("similarity", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(["image_id"], ["image.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["neighbor_id"], ["image.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("image_id", "neighbor_id"),
+    )
+    op.create_index(
+        op.f("ix_imageneighbor_neighbor_id"),
+        "imageneighbor",
+        ["neighbor_id"],
+        unique=False,
+    )
+    op.add_column(
+        "image", sa.Column("neighbors_updated_at", sa.DateTime(), nullable=True)
+    )
+
+    # materialize lists for images that were embedded before this stage existed
+    op.execute("""
+        INSERT INTO serviceq (id, image_id, service_type, status, created_at, updated_at)
+        SELECT gen_random_uuid(), id, 'NEIGHBORS', 'PENDING', NOW(), NOW()
+        FROM image
+        WHERE embeddings IS NOT NULL
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # postgres cannot drop enum values, 'NEIGHBORS' stays on servicetype
+    op.execute("DELETE FROM serviceq WHERE service_type = 'NEIGHBORS'")
+    op.drop_column("image", "neighbors_updated_at")
+    op.drop_index(op.f("ix_imageneighbor_neighbor_id"), table_name="imageneighbor")
+    op.drop_table("imageneighbor")
@@ -0,0 +1,59 @@
+"""add serviceq backoff
+
+Revision ID: 64b2cc29bd96
+Revises: 3be4ef9646a1
+Create Date: 2026-10-19 18:47:03.215840
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "64b2cc29bd96"
+down_revision: Union[str, Sequence[str], None] = "3be4ef9646a1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "serviceq",
+        sa.Column(
+            "run_after", sa.DateTime(), nullable=False, server_default=sa.func.now()
+        ),
+    )
+    op.add_column("serviceq", sa.Column("last_error", sa.String(), nullable=True))
+    op.drop_index(
+        "ix_serviceq_pending",
+        table_name="serviceq",
+        postgresql_where=sa.text("status = 'PENDING'"),
+    )
+    op.create_index(
+        "ix_serviceq_pending",
+        "serviceq",
+        ["run_after"],
+        unique=False,
+        postgresql_where=sa.text("status = 'PENDING'"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        "ix_serviceq_pending",
+        table_name="serviceq",
+        postgresql_where=sa.text("status = 'PENDING'"),
+    )
+    op.create_index(
+        "ix_serviceq_pending",
+        "serviceq",
+        ["created_at"],
+        unique=False,
+        postgresql_where=sa.text("status = 'PENDING'"),
+    )
+    op.drop_column("serviceq", "last_error")
+    op.drop_column("serviceq", "run_after")
@@ -0,0 +1,53 @@
+"""unique active serviceq jobs
+
+Revision ID: 9d7c173e53a5
+Revises: 089010a8961a
+Create Date: 2026-10-19 20:11:26.734402
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9d7c173e53a5"
+down_revision: Union[str, Sequence[str], None] = "089010a8961a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # keep one active job per image and service type, preferring the running one
+    op.execute(
+        """
+        DELETE FROM serviceq
+        USING (
+            SELECT id, row_number() OVER (
+                PARTITION BY image_id, service_type
+                ORDER BY status = 'RUNNING' DESC, created_at
+            ) AS rank
+            FROM serviceq
+            WHERE status IN ('PENDING', 'RUNNING')
+        ) duplicate
+        WHERE serviceq.id = duplicate.id AND duplicate.rank > 1
+        """
+    )
+    op.create_index(
+        "ux_serviceq_active",
+        "serviceq",
+        ["image_id", "service_type"],
+        unique=True,
+        postgresql_where=sa.text("status IN ('PENDING', 'RUNNING')"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        "ux_serviceq_active",
+        table_name="serviceq",
+        postgresql_where=sa.text("status IN ('PENDING', 'RUNNING')"),
+    )
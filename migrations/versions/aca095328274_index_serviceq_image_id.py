@@ -0,0 +1,29 @@
+"""index serviceq image_id
+
+Revision ID: aca095328274
+Revises: 9d7c173e53a5
+Create Date: 2026-10-19 20:52:08.119364
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "aca095328274"
+down_revision: Union[str, Sequence[str], None] = "9d7c173e53a5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        op.f("ix_serviceq_image_id"), "serviceq", ["image_id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_serviceq_image_id"), table_name="serviceq")
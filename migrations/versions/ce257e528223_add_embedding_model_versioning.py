@@ -0,0 +1,74 @@
+"""add embedding model versioning
+
+Revision ID: ce257e528223
+Revises: 45bd6a4a44a7
+Create Date: 2026-10-19 12:41:07.335190
+
+"""
+
+from typing import Sequence, Union
+
+import pgvector.sqlalchemy
+import sqlalchemy as sa
+import sqlmodel
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "ce257e528223"
+down_revision: Union[str, Sequence[str], None] = "45bd6a4a44a7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# the model every existing embedding was produced with
+_INITIAL_MODEL = "openai/clip-vit-base-patch32"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "embeddingmodel",
+        sa.Column("name", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column(
+            "status",
+            sa.Enum("BUILDING", "ACTIVE", "RETIRED", name="embeddingmodelstatus"),
+            nullable=False,
+        ),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("name"),
+    )
+    op.create_table(
+        "imageembedding",
+        sa.Column("image_id", sa.Uuid(), nullable=False),
+        sa.Column("model", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column(
+            "embeddings", pgvector.sqlalchemy.halfvec.HALFVEC(dim=512), nullable=True
+        ),
+        sa.ForeignKeyConstraint(["image_id"], ["image.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["model"], ["embeddingmodel.name"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("image_id", "model"),
+    )
+    op.add_column(
+        "image",
+        sa.Column("embedding_model", sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    )
+
+    op.execute(
+        sa.text("""
+            INSERT INTO embeddingmodel (name, status, created_at, updated_at)
+            VALUES (:name, 'ACTIVE', NOW(), NOW())
+        """).bindparams(name=_INITIAL_MODEL)
+    )
+    op.execute(
+        sa.text(
+            "UPDATE image SET embedding_model = :name WHERE embeddings IS NOT NULL"
+        ).bindparams(name=_INITIAL_MODEL)
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("image", "embedding_model")
+    op.drop_table("imageembedding")
+    op.drop_table("embeddingmodel")
+    op.execute("DROP TYPE embeddingmodelstatus")
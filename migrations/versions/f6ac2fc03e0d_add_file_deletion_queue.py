@@ -0,0 +1,38 @@
+"""add file deletion queue
+
+Revision ID: f6ac2fc03e0d
+Revises: 0c7ee953294b
+Create Date: 2026-10-19 22:31:46.270193
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f6ac2fc03e0d"
+down_revision: Union[str, Sequence[str], None] = "0c7ee953294b"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "filedeletion",
+        sa.Column("id", sa.Uuid(), nullable=False),
+        sa.Column("path", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_image_path"), "image", ["path"], unique=False)
+    op.create_index(op.f("ix_image_thumb"), "image", ["thumb"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_image_thumb"), table_name="image")
+    op.drop_index(op.f("ix_image_path"), table_name="image")
+    op.drop_table("filedeletion")
@@ -0,0 +1,23 @@
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.helpers.constants import ORPHAN_GRACE_SECONDS, UPLOAD_DIR
+from app.worker.reaper import collect_orphans
+
+
+async def collect() -> None:
+    print(
+        f"Collecting files in {UPLOAD_DIR} no image refers to, "
+        f"older than {ORPHAN_GRACE_SECONDS}s"
+    )
+    start = time.perf_counter()
+    removed = await collect_orphans()
+    print(f"\nDone: {removed} files removed in {time.perf_counter() - start:.1f}s.")
+
+
+if __name__ == "__main__":
+    asyncio.run(collect())
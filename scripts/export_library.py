@@ -0,0 +1,46 @@
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime
+from uuid import UUID
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.helpers.export import ExportFilter, export_library
+
+
+async def export(args) -> None:
+    filters = ExportFilter(
+        tag=args.tag,
+        uploaded_by=args.uploaded_by,
+        created_after=args.created_after,
+        created_before=args.created_before,
+        embedded_only=args.embedded_only,
+    )
+    written = 0
+    with open(args.out, "wb") as f:
+        async for chunk in export_library(filters):
+            f.write(chunk)
+            written += len(chunk)
+
+    print(f"Wrote {written / 2**20:.1f} MB to {args.out}")
+    print("Unpack with tar -xf, then load embeddings.npy with numpy.load")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export image metadata and embeddings as a tar of "
+        "embeddings.npy and images.jsonl."
+    )
+    parser.add_argument(
+        "--out", default=f"scene-export-{datetime.now():%Y%m%d-%H%M%S}.tar"
+    )
+    parser.add_argument("--tag")
+    parser.add_argument("--uploaded-by", type=UUID)
+    parser.add_argument("--created-after", type=datetime.fromisoformat)
+    parser.add_argument("--created-before", type=datetime.fromisoformat)
+    parser.add_argument(
+        "--embedded-only", action="store_true", help="skip images without embeddings"
+    )
+    asyncio.run(export(parser.parse_args()))
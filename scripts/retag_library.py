@@ -0,0 +1,24 @@
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import async_session
+from app.helpers.constants import AUTOTAG_VOCABULARY
+from app.worker.autotag import retag_library
+
+
+async def retag() -> None:
+    print(f"Re-tagging with {len(AUTOTAG_VOCABULARY)} tags: {AUTOTAG_VOCABULARY}")
+    start = time.perf_counter()
+
+    async with async_session() as session:
+        tagged = await retag_library(session)
+
+    print(f"\nDone: {tagged} images tagged in {time.perf_counter() - start:.1f}s.")
+
+
+if __name__ == "__main__":
+    asyncio.run(retag())
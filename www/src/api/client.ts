@@ -39,10 +39,10 @@ export function imageUrl(imageId: string) {
   return `${BASE}/${imageId}/`
 }
 
-export async function uploadImage(file: File): Promise<UploadResponse> {
+export async function uploadImage(file: File, bulk = false): Promise<UploadResponse> {
   const form = new FormData()
   form.append('file', file)
-  const res = await fetch(`${BASE}/`, { method: 'POST', body: form })
+  const res = await fetch(`${BASE}/${bulk ? '?bulk=true' : ''}`, { method: 'POST', body: form })
   if (!res.ok) {
     const err = await res.json().catch(() => ({ detail: res.statusText }))
     const detail = Array.isArray(err.detail) ? err.detail[0]?.msg : err.detail
@@ -1,6 +1,9 @@
 import { useCallback, useRef, useState } from 'react'
 import { listKey, uploadImage } from '@/api/client'
 
+// batches larger than this are processed at bulk priority, behind single uploads
+const BULK_UPLOAD_THRESHOLD = 20
+
 export interface UploadItem {
   id: string
   file: File
@@ -57,6 +60,7 @@ export function useUploadQueue({ addToast, mutate }: UseUploadQueueOptions) {
 
     uploadInProgressRef.current = true
     abortedRef.current = false
+    const bulk = pending.length > BULK_UPLOAD_THRESHOLD
     let succeeded = 0
     let failed = 0
 
@@ -70,7 +74,7 @@ export function useUploadQueue({ addToast, mutate }: UseUploadQueueOptions) {
           )
         )
         try {
-          await uploadImage(item.file)
+          await uploadImage(item.file, bulk)
           setItems((prev) =>
             prev.map((i) => (i.id === item.id ? { ...i, status: 'done' as const } : i))
           )